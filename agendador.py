@@ -0,0 +1,60 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- CONFIGURAÇÃO ---
+MAX_CLIENTES_PARALELO = int(os.getenv("MAX_CLIENTES_PARALELO", "3"))
+
+# Cliente dono da thread atual; é o que permite separar o log de cada execução.
+cliente_atual = contextvars.ContextVar("cliente_atual", default=None)
+
+# --- PROPAGAÇÃO DE CONTEXTO ---
+
+def submeter_com_contexto(executor, funcao, *args, **kwargs):
+    """executor.submit que leva junto o cliente atual (as threads do pool não herdam contextvars)."""
+    return executor.submit(contextvars.copy_context().run, funcao, *args, **kwargs)
+
+def _executar_como(cliente, funcao, args):
+    cliente_atual.set(cliente)
+    return funcao(*args)
+
+# --- SAÍDA POR CLIENTE ---
+
+class RoteadorSaida:
+    """Substitui o sys.stdout e entrega cada print ao destino do cliente que o gerou."""
+
+    def __init__(self, destinos, padrao):
+        self.destinos = destinos
+        self.padrao = padrao
+
+    def write(self, string):
+        destino = self.destinos.get(cliente_atual.get(), self.padrao)
+        return destino.write(string)
+
+    def flush(self):
+        for destino in list(self.destinos.values()) + [self.padrao]:
+            try:
+                destino.flush()
+            except Exception:
+                pass
+
+# --- EXECUÇÃO ---
+
+def executar_clientes(tarefas, max_paralelo=MAX_CLIENTES_PARALELO):
+    """
+    Executa { cliente: (funcao, args) } em paralelo e devolve (cliente, resultado, erro)
+    na ordem em que cada cliente termina.
+    """
+    if not tarefas:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_paralelo, len(tarefas))), thread_name_prefix="cliente") as executor:
+        futuros = {
+            submeter_com_contexto(executor, _executar_como, cliente, funcao, args): cliente
+            for cliente, (funcao, args) in tarefas.items()
+        }
+        for fut in as_completed(futuros):
+            cliente = futuros[fut]
+            try:
+                yield cliente, fut.result(), None
+            except Exception as e:
+                yield cliente, None, e
@@ -1,8 +1,7 @@
 import streamlit as st
 import os
-import sys
-import threading
 import json
+import pandas as pd
 from dotenv import load_dotenv
 
 # --- TRUQUE DE SEGURANÇA PARA A NUVEM ---
@@ -10,9 +9,11 @@ if "google_credentials" in st.secrets:
     with open("credentials.json", "w", encoding="utf-8") as f:
         json.dump(dict(st.secrets["google_credentials"]), f)
             
-from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
-from extrator import processar_cliente
-from gerador_pagos import processar_faturas_pagas
+from agendador import MAX_CLIENTES_PARALELO
+from metricas import carregar_tabelas
+from trabalhos import (
+    submeter, listar, TrabalhoDuplicado, EXTRACAO, PAGO, ATIVOS, PENDENTE, EXECUTANDO, CONCLUIDO, FALHOU, INTERROMPIDO,
+)
 
 load_dotenv(".env")
 
@@ -85,26 +86,115 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- COMPONENTE DE LOG EM TEMPO REAL ---
-class StreamlitRedirect:
-    def __init__(self, st_empty):
-        self.st_empty = st_empty
-        self.text = ""
-        self.ctx = get_script_run_ctx()
+# --- EXECUÇÕES EM SEGUNDO PLANO ---
+# Cada execução roda num processo próprio (trabalhos.py): rerun, clique ou reconexão do navegador
+# não a interrompem. A tela só consulta o registro e redesenha o progresso a cada poucos segundos.
+ICONES_ESTADO = {PENDENTE: "⏳", EXECUTANDO: "🔄", CONCLUIDO: "✅", FALHOU: "❌", INTERROMPIDO: "⚠️"}
+
+def iniciar_execucao(tipo, clientes_abas, argumentos, max_paralelo=None, retomar=False):
+    try:
+        trabalho_id = submeter(tipo, clientes_abas, argumentos, max_paralelo, retomar)
+    except TrabalhoDuplicado as e:
+        st.error(f"⛔ Não iniciado: {e}")
+        return
+    st.success(f"🚀 Execução #{trabalho_id} iniciada em segundo plano. Pode continuar usando a página.")
+
+def painel_execucoes(tipo):
+    # Só as execuções em andamento ficam no fragmento que atualiza sozinho; sem nenhuma ativa,
+    # a página não faz polling nem relê logs e métricas das que já terminaram.
+    trabalhos = listar(tipo)
+    if not trabalhos:
+        st.caption("Nenhuma execução registrada ainda.")
+        return
+    if any(t["estado"] in ATIVOS for t in trabalhos):
+        painel_ativos(tipo)
+    for trabalho in trabalhos:
+        if trabalho["estado"] not in ATIVOS:
+            mostrar_trabalho(tipo, trabalho)
+
+@st.fragment(run_every=2)
+def painel_ativos(tipo):
+    ativos = [t for t in listar(tipo) if t["estado"] in ATIVOS]
+    if not ativos:
+        st.rerun()   # a última terminou: redesenha a página inteira, que para de chamar este fragmento
+    for trabalho in ativos:
+        mostrar_trabalho(tipo, trabalho)
+
+def mostrar_trabalho(tipo, trabalho):
+    ativo = trabalho["estado"] in ATIVOS
+    clientes = trabalho["clientes"]
+    concluidos = sum(1 for c in clientes if c["estado"] not in ATIVOS)
+    titulo = (f"{ICONES_ESTADO.get(trabalho['estado'], '')} Execução #{trabalho['id']} "
+              f"({', '.join(c['cliente'].upper() for c in clientes)}) - {trabalho['estado']}")
+    with st.expander(titulo, expanded=ativo):
+        if ativo:
+            st.progress(concluidos / len(clientes), text=f"{concluidos}/{len(clientes)} clientes concluídos")
+        if trabalho["erro"]:
+            st.error(f"Erro: {trabalho['erro']}")
+        for c in clientes:
+            resultado = c["resultado"] or c["estado"]
+            if c["estado"] == CONCLUIDO:
+                st.success(f"**{c['cliente'].upper()}**: {resultado}")
+            elif c["estado"] in ATIVOS:
+                st.info(f"**{c['cliente'].upper()}**: {resultado}")
+            else:
+                st.error(f"**{c['cliente'].upper()}**: {resultado}")
+                if tipo == EXTRACAO:
+                    mostrar_capturas_erro(c["cliente"])
+            if c["log_recente"]:
+                st.code(c["log_recente"], language='bash')
+        if trabalho["log_recente"]:
+            st.code(trabalho["log_recente"], language='bash')
+        if not ativo:
+            if trabalho["metricas"]:
+                mostrar_metricas(trabalho["metricas"])
+            botoes_download_log(trabalho)
+
+def mostrar_capturas_erro(cli):
+    for img_name in [f"erro_sem_token_{cli}.png", f"erro_botao_{cli}.png", f"erro_fatal_{cli}.png"]:
+        if os.path.exists(img_name):
+            st.error(f"📸 O robô travou nesta tela (Conta {cli.upper()}):")
+            st.image(img_name)
+
+def botoes_download_log(trabalho):
+    pasta = trabalho["pasta_log"]
+    if not pasta or not os.path.isdir(pasta):
+        return
+    arquivos = sorted(a for a in os.listdir(pasta) if a.endswith(".log"))
+    colunas = st.columns(max(1, min(len(arquivos), 4)))
+    for i, arquivo in enumerate(arquivos):
+        # O arquivo só é lido quando o botão é clicado, não a cada redesenho da página
+        colunas[i % len(colunas)].download_button(
+            f"📥 Log {os.path.splitext(arquivo)[0].upper()}", _leitor_arquivo(os.path.join(pasta, arquivo)),
+            file_name=f"execucao_{trabalho['id']}_{arquivo}", mime="text/plain", key=f"log_{trabalho['id']}_{arquivo}",
+        )
 
-    def write(self, string):
-        if not string: return
-        self.text += string
-        linhas = self.text.split('\n')[-15:]
-        try:
-            if self.ctx:
-                add_script_run_ctx(threading.current_thread(), self.ctx)
-            self.st_empty.code('\n'.join(linhas), language='bash')
-        except Exception:
-            pass
+def _leitor_arquivo(caminho):
+    def ler():
+        with open(caminho, "rb") as f:
+            return f.read()
+    return ler
 
-    def flush(self):
-        pass
+# --- MÉTRICAS DA EXECUÇÃO ---
+def mostrar_metricas(caminho_metricas):
+    """Tempo de cada etapa por cliente, a partir do JSON que a execução gravou (metricas.py)."""
+    if not os.path.exists(caminho_metricas):
+        return
+    linhas_etapas, linhas_contadores = carregar_tabelas(caminho_metricas)
+    etapas = pd.DataFrame(linhas_etapas)
+    if etapas.empty:
+        return
+    st.markdown("**⏱️ Tempo por Etapa (segundos)**")
+    st.dataframe(
+        etapas.pivot_table(index="cliente", columns="etapa", values="total_s", aggfunc="sum").round(2),
+        use_container_width=True,
+    )
+    if st.toggle("📈 Detalhes (histogramas e contadores)", key=f"detalhes_{caminho_metricas}"):
+        st.dataframe(etapas.round(3), use_container_width=True, hide_index=True)
+        contadores = pd.DataFrame(linhas_contadores)
+        if not contadores.empty:
+            st.dataframe(contadores.fillna(""), use_container_width=True, hide_index=True)
+        st.caption(f"Arquivos gravados: {caminho_metricas} | {os.path.splitext(caminho_metricas)[0]}.prom")
 
 clientes_disponiveis = ['blue', 'criatech', 'soft', 'softcomp', 'DNA', 'NCA']
 
@@ -140,10 +230,27 @@ with col1:
 with col2:
     if modo == "Rodar Todos":
         clientes_selecionados = clientes_disponiveis
-        st.info("Todos os clientes serão processados na sequência.")
+        st.info("Todos os clientes serão processados.")
     else:
         clientes_selecionados = st.multiselect("Selecione os clientes:", clientes_disponiveis, default=[clientes_disponiveis[0]])
 
+max_paralelo = st.sidebar.number_input(
+    "Clientes em paralelo:", min_value=1, max_value=len(clientes_disponiveis), value=min(MAX_CLIENTES_PARALELO, len(clientes_disponiveis))
+)
+retomar = st.sidebar.checkbox(
+    "♻️ Retomar execução interrompida", value=False,
+    help="Se a última execução de um cliente caiu no meio, continua dela: só o que faltou é refeito.",
+)
+
+
+MAPA_ABAS = {
+    "blue": "Controle_BlueSolutions_Automação",
+    "criatech": "Controle_Criatech_Automação",
+    "soft": "Controle_SoftDados_Automação",
+    "softcomp": "Controle_SoftComp_Automação",
+    "DNA": "Controle_DNA_Automação",
+    "NCA": "Controle_NCA_Automação"
+}
 
 # ==========================================
 # MÓDULO 1: EXTRAIR FATURAS COELBA
@@ -156,64 +263,23 @@ if "Extrair Faturas" in modulo_selecionado:
         if not clientes_selecionados:
             st.warning("⚠️ Selecione pelo menos um cliente para continuar.")
         else:
-            st.info(f"Iniciando extração para: {', '.join(clientes_selecionados)}")
-            
-            barra_progresso = st.progress(0)
-            texto_status = st.empty()
-            caixa_log = st.empty()
-            
-            resultados = {}
-            old_stdout = sys.stdout
-            sys.stdout = StreamlitRedirect(caixa_log)
-            
-            try:
-                for i, cliente in enumerate(clientes_selecionados):
-                    texto_status.write(f"**Extraindo:** {cliente.upper()} ({i+1}/{len(clientes_selecionados)})")
-                    
-                    try:
-                        login_user = str(st.secrets[f"{cliente.upper()}_LOGIN_USER"])
-                        login_password = str(st.secrets[f"{cliente.upper()}_LOGIN_PASSWORD"])
-                        
-                        MAPA_ABAS = {
-                            "blue": "Controle_BlueSolutions_Automação",
-                            "criatech": "Controle_Criatech_Automação",
-                            "soft": "Controle_SoftDados_Automação",
-                            "softcomp": "Controle_SoftComp_Automação",
-                            "DNA": "Controle_DNA_Automação",
-                            "NCA": "Controle_NCA_Automação"
-                        }
-                        worksheet = MAPA_ABAS.get(cliente)
-                        
-                    except KeyError:
-                        resultados[cliente] = "❌ Falha (Dados faltando no Cofre/Secrets)"
-                        continue
-                    
-                    with st.spinner(f"O robô está trabalhando na conta {cliente}..."):
-                        sucesso = processar_cliente(cliente, login_user, login_password, worksheet)
-                    
-                    if sucesso:
-                        resultados[cliente] = "✅ Sucesso"
-                    else:
-                        resultados[cliente] = "❌ Falha no Login"
-                        
-                        for img_name in [f"erro_sem_token_{cliente}.png", f"erro_botao_{cliente}.png", f"erro_fatal_{cliente}.png"]:
-                            if os.path.exists(img_name):
-                                st.error(f"📸 O robô travou nesta tela (Conta {cliente.upper()}):")
-                                st.image(img_name)
-
-                    barra_progresso.progress((i + 1) / len(clientes_selecionados))
-            finally:
-                sys.stdout = old_stdout
-                
-            texto_status.success("🎉 Extração da Coelba concluída!")
-            
-            st.divider()
-            st.subheader("📊 Relatório de Execução - Extração")
-            for cli, status in resultados.items():
-                if "✅" in status:
-                    st.success(f"**{cli.upper()}**: {status}")
-                else:
-                    st.error(f"**{cli.upper()}**: {status}")
+            argumentos = {}
+            for cliente in clientes_selecionados:
+                try:
+                    login_user = str(st.secrets[f"{cliente.upper()}_LOGIN_USER"])
+                    login_password = str(st.secrets[f"{cliente.upper()}_LOGIN_PASSWORD"])
+                    worksheet = MAPA_ABAS.get(cliente)
+                except KeyError:
+                    st.error(f"**{cliente.upper()}**: ❌ Falha (Dados faltando no Cofre/Secrets)")
+                    continue
+                argumentos[cliente] = (login_user, login_password, worksheet)
+            if argumentos:
+                st.info(f"Iniciando extração para: {', '.join(argumentos)} ({max_paralelo} por vez)")
+                iniciar_execucao(EXTRACAO, {c: a[2] for c, a in argumentos.items()}, argumentos, max_paralelo, retomar)
+    
+    st.divider()
+    st.subheader("📊 Relatório de Execução - Extração")
+    painel_execucoes(EXTRACAO)
 
 # ==========================================
 # MÓDULO 2: GERAR PDFS 'PAGO'
@@ -227,39 +293,9 @@ elif "Gerar PDFs 'PAGO'" in modulo_selecionado:
             st.warning("⚠️ Selecione pelo menos um cliente para continuar.")
         else:
             st.info(f"Iniciando processamento PAGO para: {', '.join(clientes_selecionados)}")
-            
-            texto_status = st.empty()
-            caixa_log = st.empty()
-            
-            old_stdout = sys.stdout
-            sys.stdout = StreamlitRedirect(caixa_log)
-            
-            try:
-                with st.spinner("Lendo planilhas e aplicando marcas d'água... isso pode levar alguns minutos."):
-                    
-                    MAPA_ABAS = {
-                        "blue": "Controle_BlueSolutions_Automação",
-                        "criatech": "Controle_Criatech_Automação",
-                        "soft": "Controle_SoftDados_Automação",
-                        "softcomp": "Controle_SoftComp_Automação",
-                        "DNA": "Controle_DNA_Automação",
-                        "NCA": "Controle_NCA_Automação"
-                    }
-                    
-                    clientes_com_aba = {}
-                    for cli in clientes_selecionados:
-                        clientes_com_aba[cli] = MAPA_ABAS.get(cli)
-
-                    resultados_pagos = processar_faturas_pagas(clientes_com_aba)
-            finally:
-                sys.stdout = old_stdout
-            
-            texto_status.success("🎉 Processamento de Pagos concluído!")
-            
-            st.divider()
-            st.subheader("📊 Relatório de Execução - PDFs Pagos")
-            for cli, status in resultados_pagos.items():
-                if "✅" in status:
-                    st.success(f"**{cli.upper()}**: {status}")
-                else:
-                    st.error(f"**{cli.upper()}**: {status}")
+            clientes_com_aba = {cli: MAPA_ABAS.get(cli) for cli in clientes_selecionados}
+            iniciar_execucao(PAGO, clientes_com_aba, clientes_com_aba, retomar=retomar)
+    
+    st.divider()
+    st.subheader("📊 Relatório de Execução - PDFs Pagos")
+    painel_execucoes(PAGO)
@@ -0,0 +1,194 @@
+"""
+Benchmark ponta a ponta sem tocar produção: extrator (processar_cliente) e gerador de PAGO
+(processar_faturas_pagas) rodando contra os serviços de servicos_falsos.py.
+
+Uso: python benchmark.py --clientes 3 --ucs 4 --faturas 6 --paginas 2 --latencia-ms 80 --taxa-erro 0.02 --limite-rps 50
+"""
+import os
+import sys
+import json
+import time
+import base64
+import tempfile
+import argparse
+import resource
+import tracemalloc
+import contextlib
+from threading import Lock
+from collections import defaultdict
+
+
+class Cronometro:
+    """Durações por etapa, coletadas substituindo funções dos módulos por versões cronometradas."""
+
+    def __init__(self):
+        self.duracoes = defaultdict(list)
+        self._lock = Lock()
+
+    def instrumentar(self, modulo, nome_funcao, etapa):
+        original = getattr(modulo, nome_funcao)
+        def cronometrada(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.duracoes[etapa].append(time.perf_counter() - inicio)
+        setattr(modulo, nome_funcao, cronometrada)
+
+    def resumo(self):
+        with self._lock:
+            return {etapa: _estatisticas(valores) for etapa, valores in sorted(self.duracoes.items())}
+
+
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+def _estatisticas(valores):
+    ordenados = sorted(valores)
+    return {
+        "n": len(ordenados), "p50_s": _percentil(ordenados, 50),
+        "p95_s": _percentil(ordenados, 95), "max_s": ordenados[-1],
+    }
+
+
+def token_falso(validade_s=3600):
+    """JWT só com o exp: suficiente para o cache de tokens aceitar sem login no navegador."""
+    def parte(dados):
+        return base64.urlsafe_b64encode(json.dumps(dados).encode()).rstrip(b"=").decode()
+    return f"{parte({'alg': 'none'})}.{parte({'exp': int(time.time()) + validade_s})}.assinatura"
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark offline do extrator e do gerador de PAGO")
+    parser.add_argument("--clientes", type=int, default=3)
+    parser.add_argument("--ucs", type=int, default=4, help="UCs por cliente")
+    parser.add_argument("--faturas", type=int, default=6, help="faturas por UC")
+    parser.add_argument("--paginas", type=int, default=2, help="páginas por PDF")
+    parser.add_argument("--paralelo", type=int, default=3, help="clientes em paralelo no extrator")
+    parser.add_argument("--latencia-ms", type=float, default=50.0, help="latência média de cada chamada")
+    parser.add_argument("--variacao-ms", type=float, default=20.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="fração de chamadas que recebem 503")
+    parser.add_argument("--limite-rps", type=float, default=None, help="limite de taxa por serviço (429 acima disso)")
+    parser.add_argument("--sem-pago", action="store_true", help="mede só o extrator")
+    parser.add_argument("--json", help="grava o relatório neste arquivo")
+    parser.add_argument("--verboso", action="store_true", help="mostra o log dos módulos")
+    return parser.parse_args()
+
+
+def main():
+    args = argumentos()
+    pasta = tempfile.mkdtemp(prefix="hub_benchmark_")
+    os.environ["HUB_CACHE_DIR"] = pasta
+
+    from servicos_falsos import (
+        SimuladorRede, ServidorNeoenergiaFalso, DriveFalso, ClienteSheetsFalso, gerar_contas,
+    )
+    def simulador():
+        return SimuladorRede(args.latencia_ms / 1000, args.variacao_ms / 1000, args.taxa_erro, args.limite_rps, semente=42)
+
+    contas, paginas = gerar_contas(args.clientes, args.ucs, args.faturas, args.paginas)
+    servidor = ServidorNeoenergiaFalso(contas, paginas, simulador()).iniciar()
+    os.environ["NEOENERGIA_API_URL"] = servidor.url
+
+    # Importados depois das variáveis de ambiente: URL da API e pasta de cache são lidas na importação
+    import extrator
+    import gerador_pagos
+    import clientes_google
+    from cache_tokens import salvar_token
+    from agendador import executar_clientes
+    from metricas import METRICAS
+
+    drive, sheets = DriveFalso(simulador()), ClienteSheetsFalso(simulador())
+    clientes = {f"bench_{i}": login for i, login in enumerate(contas)}
+    abas = {cliente: f"Controle_{cliente}" for cliente in clientes}
+    sheets.criar_planilha(extrator.SPREADSHEET_ID, abas.values())
+    clientes_google.usar_servicos(sheets, drive)
+    for cliente, login in clientes.items():
+        salvar_token(cliente, login, token_falso())
+
+    cronometro = Cronometro()
+    for modulo, funcao, etapa in [
+        (extrator, "buscar_ucs", "neoenergia.ucs"),
+        (extrator, "buscar_faturas_uc", "neoenergia.faturas_uc"),
+        (extrator, "baixar_pdf_neoenergia", "neoenergia.pdf"),
+        (extrator, "upload_stream_para_drive", "drive.upload_fatura"),
+        (extrator, "baixar_pdf_fatura", "extrator.fatura"),
+        (extrator, "sincronizar_planilha", "sheets.sincronizar"),
+        (extrator, "processar_cliente", "extrator.cliente"),
+        (gerador_pagos, "etapa_download", "pago.download"),
+        (gerador_pagos, "etapa_marca_dagua", "pago.marca_dagua"),
+        (gerador_pagos, "etapa_upload", "pago.upload"),
+    ]:
+        cronometro.instrumentar(modulo, funcao, etapa)
+
+    saida = contextlib.nullcontext() if args.verboso else contextlib.redirect_stdout(open(os.devnull, "w"))
+    tracemalloc.start()
+    relatorio = {"parametros": vars(args), "tempos": {}}
+    with saida:
+        inicio = time.perf_counter()
+        tarefas = {
+            cliente: (extrator.processar_cliente, (cliente, login, "senha", abas[cliente]))
+            for cliente, login in clientes.items()
+        }
+        falhas = {
+            c: repr(erro) if erro else "processar_cliente retornou False"
+            for c, resultado, erro in executar_clientes(tarefas, args.paralelo) if erro or not resultado
+        }
+        relatorio["tempos"]["extrator_s"] = time.perf_counter() - inicio
+
+        if not args.sem_pago:
+            inicio = time.perf_counter()
+            gerador_pagos.processar_faturas_pagas(abas)
+            relatorio["tempos"]["pago_s"] = time.perf_counter() - inicio
+    _, pico_python = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    servidor.parar()
+
+    total_faturas = args.clientes * args.ucs * args.faturas
+    relatorio["vazao"] = {"faturas_por_s_extrator": total_faturas / relatorio["tempos"]["extrator_s"]}
+    if "pago_s" in relatorio["tempos"]:
+        pagos = len(cronometro.duracoes.get("pago.upload", []))
+        relatorio["vazao"]["paginas_por_s_pago"] = pagos * args.paginas / relatorio["tempos"]["pago_s"]
+    relatorio["etapas"] = cronometro.resumo()
+    relatorio["memoria"] = {
+        "pico_python_mb": pico_python / 1024 / 1024,
+        # ru_maxrss vem em KB no Linux; os processos da marca d'água não entram aqui
+        "pico_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    relatorio["servicos"] = {
+        "neoenergia": servidor.simulador.estatisticas,
+        "drive": drive.simulador.estatisticas,
+        "sheets": sheets.simulador.estatisticas,
+    }
+    relatorio["clientes_com_falha"] = falhas
+    # Mesmas métricas que o app grava (tempo por etapa e cliente, contadores de faturas, retentativas e bytes)
+    relatorio["arquivos_metricas"] = METRICAS.exportar("benchmark", os.path.join(pasta, "metricas"))
+    imprimir(relatorio, total_faturas)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+
+def imprimir(relatorio, total_faturas):
+    tempos, vazao, memoria = relatorio["tempos"], relatorio["vazao"], relatorio["memoria"]
+    print(f"📦 {total_faturas} faturas | extrator {tempos['extrator_s']:.2f}s "
+          f"({vazao['faturas_por_s_extrator']:.1f} faturas/s)", end="")
+    if "pago_s" in tempos:
+        print(f" | PAGO {tempos['pago_s']:.2f}s ({vazao['paginas_por_s_pago']:.1f} páginas/s)", end="")
+    print()
+    print(f"{'etapa':<24}{'n':>6}{'p50 (s)':>10}{'p95 (s)':>10}{'máx (s)':>10}")
+    for etapa, e in relatorio["etapas"].items():
+        print(f"{etapa:<24}{e['n']:>6}{e['p50_s']:>10.3f}{e['p95_s']:>10.3f}{e['max_s']:>10.3f}")
+    print(f"🧠 memória: pico Python {memoria['pico_python_mb']:.1f} MB, pico RSS {memoria['pico_rss_mb']:.1f} MB")
+    for servico, estatisticas in relatorio["servicos"].items():
+        injetados = {k: estatisticas.get(k, 0) for k in ("429", "503")}
+        chamadas = sum(v for k, v in estatisticas.items() if k not in injetados)
+        print(f"🌐 {servico}: {chamadas} chamadas, {injetados['429']} respostas 429, {injetados['503']} respostas 503")
+    for cliente, motivo in relatorio["clientes_com_falha"].items():
+        print(f"❌ {cliente}: {motivo}")
+    print("📁 métricas detalhadas: " + " | ".join(relatorio["arquivos_metricas"]))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
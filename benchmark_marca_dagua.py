@@ -0,0 +1,74 @@
+"""
+Micro-benchmark da marca d'água PAGO: merge_page com overlay carta (motor antigo) x Form XObject por tamanho.
+Uso: python benchmark_marca_dagua.py [--paginas 40] [--repeticoes 5]
+"""
+import io
+import time
+import argparse
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter, A4
+from PyPDF2 import PdfReader, PdfWriter
+
+from marca_dagua import adicionar_marca_dagua, criar_marca_dagua_cache
+
+
+def gerar_pdf_exemplo(paginas):
+    """Fatura sintética: páginas carta e A4 alternadas, cada uma gerada à parte (fontes repetidas, como em PDFs concatenados)."""
+    writer = PdfWriter()
+    for i in range(paginas):
+        tamanho = A4 if i % 2 else letter
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer, pagesize=tamanho)
+        c.setFont("Helvetica", 10)
+        for linha in range(60):
+            c.drawString(40, tamanho[1] - 40 - linha * 12, f"Fatura de exemplo - página {i + 1} - item {linha:02d} - R$ {linha * 3.7:.2f}")
+        c.rect(30, 30, tamanho[0] - 60, tamanho[1] - 60)
+        c.save()
+        writer.add_page(PdfReader(io.BytesIO(buffer.getvalue())).pages[0])
+    saida = io.BytesIO()
+    writer.write(saida)
+    return saida.getvalue()
+
+
+_MARCA_CARTA = None
+
+def marca_dagua_merge_page(pdf_bytes):
+    """Motor antigo: um overlay carta mesclado página a página com merge_page."""
+    global _MARCA_CARTA
+    if _MARCA_CARTA is None:
+        _MARCA_CARTA = criar_marca_dagua_cache()
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    writer = PdfWriter()
+    for page in reader.pages:
+        page.merge_page(_MARCA_CARTA)
+        writer.add_page(page)
+    saida = io.BytesIO()
+    writer.write(saida)
+    return saida.getvalue()
+
+
+def medir(funcao, pdf_bytes, paginas, repeticoes):
+    funcao(pdf_bytes)  # aquece caches (overlay por tamanho, imports)
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        saida = funcao(pdf_bytes)
+    duracao = time.perf_counter() - inicio
+    return paginas * repeticoes / duracao, len(saida)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paginas", type=int, default=40)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    pdf_bytes = gerar_pdf_exemplo(args.paginas)
+    print(f"PDF de entrada: {args.paginas} páginas, {len(pdf_bytes) / 1024:.1f} KB")
+    for nome, funcao in (("merge_page (antigo)", marca_dagua_merge_page), ("Form XObject", adicionar_marca_dagua)):
+        paginas_s, tamanho = medir(funcao, pdf_bytes, args.paginas, args.repeticoes)
+        print(f"  {nome:<20} {paginas_s:8.1f} páginas/s   saída {tamanho / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import os
+import json
+import time
+import base64
+from threading import Lock
+
+# --- CONFIGURAÇÃO ---
+# Os tokens ficam fora do repositório (pasta .cache ignorada pelo git).
+PASTA_CACHE = os.getenv("HUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+ARQUIVO_TOKENS = os.path.join(PASTA_CACHE, "tokens_neoenergia.json")
+
+# Quando o JWT não traz "exp", assumimos uma validade curta e deixamos a chamada de validação decidir.
+VALIDADE_PADRAO_SEGUNDOS = 30 * 60
+# Margem para não usar um token que vai expirar no meio da execução.
+MARGEM_EXPIRACAO_SEGUNDOS = 120
+
+_lock_tokens = Lock()
+
+# --- FUNÇÕES AUXILIARES ---
+
+def decodificar_expiracao_jwt(token):
+    """Lê o claim "exp" do payload do JWT sem validar a assinatura."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except Exception:
+        return None
+
+def _chave(cliente, login_user):
+    return f"{cliente}:{login_user}"
+
+def _ler_arquivo():
+    try:
+        with open(ARQUIVO_TOKENS, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_arquivo(dados):
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    temporario = ARQUIVO_TOKENS + ".tmp"
+    fd = os.open(temporario, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(dados, f)
+    os.replace(temporario, ARQUIVO_TOKENS)
+
+# --- API DO CACHE ---
+
+def carregar_token(cliente, login_user):
+    with _lock_tokens:
+        registro = _ler_arquivo().get(_chave(cliente, login_user))
+    if not registro:
+        return None
+    if registro.get("expira_em", 0) - MARGEM_EXPIRACAO_SEGUNDOS <= time.time():
+        return None
+    return registro.get("token")
+
+def salvar_token(cliente, login_user, token):
+    expira_em = decodificar_expiracao_jwt(token) or (time.time() + VALIDADE_PADRAO_SEGUNDOS)
+    with _lock_tokens:
+        dados = _ler_arquivo()
+        dados[_chave(cliente, login_user)] = {"token": token, "expira_em": expira_em, "salvo_em": time.time()}
+        _gravar_arquivo(dados)
+
+def invalidar_token(cliente, login_user):
+    with _lock_tokens:
+        dados = _ler_arquivo()
+        if dados.pop(_chave(cliente, login_user), None) is not None:
+            _gravar_arquivo(dados)
@@ -0,0 +1,86 @@
+import os
+import re
+import time
+from threading import Lock
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from agendador import cliente_atual
+
+# --- CONFIGURAÇÃO ---
+TENTATIVAS_HTTP = int(os.getenv("TENTATIVAS_HTTP", "3"))
+BACKOFF_HTTP = float(os.getenv("BACKOFF_HTTP", "0.5"))
+
+# Trechos variáveis da URL (números de fatura, documentos) viram um rótulo fixo por endpoint.
+_PADRAO_NUMEROS = re.compile(r"/\d+(?=/|$)")
+
+
+def rotulo_endpoint(url):
+    caminho = requests.utils.urlparse(url).path
+    return _PADRAO_NUMEROS.sub("/{n}", caminho)
+
+
+class ClienteHTTP:
+    """
+    Sessão única (keep-alive) para uma API, com pool de conexões do tamanho dos workers,
+    retentativa só de falhas de conexão/leitura e registro do tempo de cada chamada.
+    Respostas 429/5xx voltam na hora: quem repete, espera o Retry-After e alimenta o disjuntor e o
+    limitador é o executar_com_retentativa (retentativas.py), sem segurar a vaga durante a espera.
+    """
+
+    def __init__(self, max_conexoes, tentativas=TENTATIVAS_HTTP, backoff=BACKOFF_HTTP, headers=None):
+        retry = Retry(
+            total=tentativas, connect=tentativas, read=tentativas, status=0,
+            backoff_factor=backoff, allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=False, raise_on_status=False,
+        )
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=max_conexoes, pool_block=True, max_retries=retry)
+        self.sessao = requests.Session()
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        if headers:
+            self.sessao.headers.update(headers)
+        self._tempos = defaultdict(list)
+        self._lock = Lock()
+
+    def get(self, url, **kwargs):
+        return self.requisitar("GET", url, **kwargs)
+
+    def requisitar(self, metodo, url, **kwargs):
+        inicio = time.perf_counter()
+        status = "ERRO"
+        try:
+            resposta = self.sessao.request(metodo, url, **kwargs)
+            status = resposta.status_code
+            return resposta
+        finally:
+            self._registrar(rotulo_endpoint(url), status, time.perf_counter() - inicio)
+
+    def _registrar(self, endpoint, status, segundos):
+        with self._lock:
+            self._tempos[(cliente_atual.get(), endpoint)].append((status, segundos))
+
+    def resumo_tempos(self, cliente=None):
+        """{ endpoint: {chamadas, erros, media_s, p95_s, max_s} } das chamadas feitas pelo cliente."""
+        with self._lock:
+            itens = [(ep, list(v)) for (cli, ep), v in self._tempos.items() if cli == cliente]
+        resumo = {}
+        for endpoint, registros in itens:
+            tempos = sorted(s for _, s in registros)
+            erros = sum(1 for st, _ in registros if st == "ERRO" or st >= 400)
+            resumo[endpoint] = {
+                "chamadas": len(tempos),
+                "erros": erros,
+                "media_s": sum(tempos) / len(tempos),
+                "p95_s": tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))],
+                "max_s": tempos[-1],
+            }
+        return resumo
+
+    def limpar_tempos(self, cliente=None):
+        with self._lock:
+            for chave in [c for c in self._tempos if c[0] == cliente]:
+                del self._tempos[chave]
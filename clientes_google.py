@@ -0,0 +1,99 @@
+import os
+import sys
+import threading
+from threading import Lock
+
+import gspread
+from google.oauth2 import service_account
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+
+# --- CONFIGURAÇÃO ---
+if getattr(sys, 'frozen', False):
+    base_path = sys._MEIPASS
+else:
+    base_path = os.path.dirname(os.path.abspath(__file__))
+
+credentials_path = os.path.join(base_path, "credentials.json")
+ESCOPOS = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+# Compartilhado pelo extrator e pelo gerador de pagos: uma credencial, um cliente gspread,
+# um serviço do Drive por thread (httplib2 não é thread-safe) e handles de planilha/aba reaproveitados.
+_lock = Lock()
+_local = threading.local()
+_credenciais = None
+_cliente_sheets = None
+_planilhas = {}
+_abas = {}
+_drive_substituto = None
+
+# --- CREDENCIAL ---
+
+def obter_credenciais():
+    global _credenciais
+    with _lock:
+        if _credenciais is None:
+            _credenciais = service_account.Credentials.from_service_account_file(credentials_path, scopes=ESCOPOS)
+        # Renova uma única vez, sob lock, quando o token expira (em vez de cada thread renovar por conta própria)
+        if not _credenciais.valid:
+            _credenciais.refresh(Request())
+        return _credenciais
+
+# --- SHEETS ---
+
+def obter_cliente_sheets():
+    global _cliente_sheets
+    with _lock:
+        if _cliente_sheets is not None:
+            return _cliente_sheets
+    credenciais = obter_credenciais()
+    with _lock:
+        if _cliente_sheets is None:
+            _cliente_sheets = gspread.authorize(credenciais)
+        return _cliente_sheets
+
+def obter_planilha(planilha_id):
+    cliente = obter_cliente_sheets()
+    with _lock:
+        planilha = _planilhas.get(planilha_id)
+    if planilha is None:
+        planilha = cliente.open_by_key(planilha_id)
+        with _lock:
+            planilha = _planilhas.setdefault(planilha_id, planilha)
+    return planilha
+
+def obter_aba(planilha_id, nome_aba):
+    chave = (planilha_id, nome_aba)
+    with _lock:
+        aba = _abas.get(chave)
+    if aba is None:
+        aba = obter_planilha(planilha_id).worksheet(nome_aba)
+        with _lock:
+            aba = _abas.setdefault(chave, aba)
+    return aba
+
+# --- DRIVE ---
+
+def obter_drive():
+    if _drive_substituto is not None:
+        return _drive_substituto
+    servico = getattr(_local, "drive", None)
+    if servico is None:
+        servico = build("drive", "v3", credentials=obter_credenciais(), cache_discovery=False)
+        _local.drive = servico
+    return servico
+
+def limpar_cache():
+    """Descarta handles de planilha/aba (ex.: depois de renomear ou recriar uma aba)."""
+    with _lock:
+        _planilhas.clear()
+        _abas.clear()
+
+def usar_servicos(cliente_sheets=None, drive=None):
+    """Troca os clientes do Google por objetos compatíveis (ex.: os de servicos_falsos no benchmark)."""
+    global _cliente_sheets, _drive_substituto
+    with _lock:
+        _cliente_sheets = cliente_sheets
+        _drive_substituto = drive
+        _planilhas.clear()
+        _abas.clear()
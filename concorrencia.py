@@ -0,0 +1,123 @@
+import os
+import time
+from collections import deque
+from threading import Condition, Lock
+
+# --- LIMITES POR SERVIÇO ---
+# (inicial, mínimo, máximo) de chamadas simultâneas, somando todos os clientes do processo.
+# Sobrescreva com CONCORRENCIA_<SERVIÇO>="inicial,minimo,maximo" (ex.: CONCORRENCIA_NEOENERGIA="8,2,40").
+LIMITES_PADRAO = {
+    "neoenergia": (8, 1, 32),
+    "drive_download": (8, 1, 32),
+    "drive_upload": (4, 1, 16),
+    "sheets": (2, 1, 8),
+}
+LIMITE_DESCONHECIDO = (4, 1, 16)
+
+FATOR_SOBRECARGA = 0.5     # 429 / cota / 5xx: corta pela metade
+FATOR_LATENCIA = 0.9       # latência subindo: corte leve
+TOLERANCIA_LATENCIA = 2.0  # média recente acima de 2x a melhor latência da janela = fila se formando
+FOLGA_LATENCIA = 0.05      # segundos; abaixo disso a diferença é ruído, não fila
+MINIMO_AMOSTRAS = 10
+
+
+def _config_limite(nome):
+    valor = os.getenv(f"CONCORRENCIA_{nome.upper()}")
+    if valor:
+        inicial, minimo, maximo = (int(v) for v in valor.split(","))
+        return inicial, minimo, maximo
+    return LIMITES_PADRAO.get(nome, LIMITE_DESCONHECIDO)
+
+
+class LimitadorAdaptativo:
+    """
+    Limite de concorrência AIMD para um serviço externo.
+    Cada chamada ocupa uma vaga; quando todas as vagas estão em uso e as respostas continuam
+    rápidas e sem erro, o limite sobe ~1 a cada rodada completa. Sinal de sobrecarga (limite de taxa,
+    5xx) corta o limite pela metade e latência crescente corta 10%, no máximo uma vez por rodada.
+    Toda mudança efetiva do limite fica registrada em `decisoes`.
+    """
+
+    def __init__(self, nome, inicial, minimo, maximo, janela=100):
+        self.nome = nome
+        self.minimo = minimo
+        self.maximo = maximo
+        self.limite = float(min(max(inicial, minimo), maximo))
+        self.em_uso = 0
+        self.pico = 0
+        self.decisoes = deque(maxlen=500)
+        self._latencias = deque(maxlen=janela)
+        self._media = None
+        self._ultima_reducao = 0.0
+        self._cond = Condition()
+
+    @property
+    def vagas(self):
+        return int(self.limite)
+
+    def adquirir(self):
+        with self._cond:
+            while self.em_uso >= self.vagas:
+                self._cond.wait()
+            self.em_uso += 1
+            self.pico = max(self.pico, self.em_uso)
+
+    def liberar(self, latencia=None, sobrecarga=False):
+        """latencia=None indica erro que não diz nada sobre a carga do serviço (ex.: 404): só devolve a vaga."""
+        with self._cond:
+            saturado = self.em_uso >= self.vagas
+            self.em_uso -= 1
+            if sobrecarga:
+                self._reduzir(FATOR_SOBRECARGA, "sobrecarga")
+            elif latencia is not None:
+                melhor = min(self._latencias) if self._latencias else latencia
+                self._latencias.append(latencia)
+                self._media = latencia if self._media is None else 0.8 * self._media + 0.2 * latencia
+                if len(self._latencias) >= MINIMO_AMOSTRAS and self._media > max(melhor * TOLERANCIA_LATENCIA, melhor + FOLGA_LATENCIA):
+                    self._reduzir(FATOR_LATENCIA, f"latência {self._media:.2f}s (melhor {melhor:.2f}s)")
+                elif saturado and self.limite < self.maximo:
+                    self._ajustar(min(self.maximo, self.limite + 1 / self.limite), "aumento")
+            self._cond.notify_all()
+
+    def _reduzir(self, fator, motivo):
+        agora = time.monotonic()
+        # As respostas de uma mesma rajada chegam quase juntas: uma redução por rodada basta
+        if agora - self._ultima_reducao < max(self._media or 0.0, 1.0):
+            return
+        self._ultima_reducao = agora
+        if self._ajustar(max(self.minimo, self.limite * fator), motivo):
+            print(f"  📉 {self.nome}: concorrência reduzida para {self.vagas} ({motivo})")
+
+    def _ajustar(self, novo, motivo):
+        anterior = self.vagas
+        self.limite = novo
+        if self.vagas == anterior:
+            return False
+        self.decisoes.append({"momento": time.time(), "de": anterior, "para": self.vagas, "motivo": motivo})
+        return True
+
+    def resumo(self):
+        with self._cond:
+            reducoes = sum(1 for d in self.decisoes if d["para"] < d["de"])
+            return {
+                "limite": self.vagas, "pico_em_uso": self.pico,
+                "aumentos": len(self.decisoes) - reducoes, "reducoes": reducoes,
+            }
+
+
+_limitadores = {}
+_lock_limitadores = Lock()
+
+def obter_limitador(servico):
+    with _lock_limitadores:
+        if servico not in _limitadores:
+            _limitadores[servico] = LimitadorAdaptativo(servico, *_config_limite(servico))
+        return _limitadores[servico]
+
+def imprimir_limitadores():
+    with _lock_limitadores:
+        limitadores = list(_limitadores.values())
+    for limitador in limitadores:
+        r = limitador.resumo()
+        print(f"  🎚️ {limitador.nome}: limite atual {r['limite']} (pico {r['pico_em_uso']} em uso, "
+              f"{r['aumentos']} aumentos, {r['reducoes']} reduções)")
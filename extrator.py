@@ -2,25 +2,31 @@ import os
 import sys
 import time
 import json
-import base64
-import requests
 import pandas as pd
-import gspread
-from threading import Lock
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from collections import Counter
 
 from dotenv import load_dotenv
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
-
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaInMemoryUpload
-from oauth2client.service_account import ServiceAccountCredentials
+from selenium.common.exceptions import TimeoutException
+
+from cache_tokens import carregar_token, salvar_token, invalidar_token
+from pool_navegadores import PoolNavegadores
+from agendador import submeter_com_contexto, cliente_atual
+from concorrencia import obter_limitador, imprimir_limitadores
+from cliente_http import ClienteHTTP
+from indice_drive import obter_indice, listar_pasta
+from sincronizacao_planilha import sincronizar_planilha
+from transferencia_pdf import BufferPDF, baixar_file_data, upload_stream_para_drive
+from retentativas import executar_com_retentativa, ErroTransferencia, categoria_por_status, CONTEUDO, OUTRO
+from metricas import medir, contar
+from retomada import obter_diario
 
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -36,23 +42,46 @@ else:
 env_path = os.path.join(base_path, ".env")
 load_dotenv(env_path)
 
-credentials_path = os.path.join(base_path, "credentials.json")
-df_lock = Lock()
-
 SPREADSHEET_ID = "1Ut5Y0LstIP7nhv7Jzyywc7SS7ObIPlO-3yEg-J8Pp5o"
 PASTA_DRIVE_ID = "1wbPLpNj_h1i3nLCEhVx2vdYyDiIval-9"
 
-# --- FUNÇÕES AUXILIARES ---
-
-def autenticar_google_sheets():
-    scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_path, scope)
-    return gspread.authorize(creds)
+URL_LOGIN = "https://agenciavirtual.neoenergia.com/#/login"
+# Configurável para apontar o extrator para um servidor local (benchmark.py / servicos_falsos.py)
+URL_API = os.getenv("NEOENERGIA_API_URL", "https://apineprd.neoenergia.com").rstrip("/")
+MAX_NAVEGADORES = int(os.getenv("MAX_NAVEGADORES", "1"))
+# Quantas chamadas à Neoenergia rodam juntas é decidido pelo limitador adaptativo (concorrencia.py);
+# os pools só precisam de threads suficientes para o teto dele.
+MAX_WORKERS_NEOENERGIA = obter_limitador("neoenergia").maximo
+
+# Colunas do DataFrame de faturas (mesma ordem de A:G na planilha) e o campo da API de onde cada uma vem
+COLUNAS_FATURAS = ["codigo_cliente", "mesReferencia", "numeroFatura", "emissão", "vencimento", "valor", "situação"]
+CAMPOS_FATURA_API = {
+    "mesReferencia": "mesReferencia", "numeroFatura": "numeroFatura", "emissão": "dataEmissao",
+    "vencimento": "dataVencimento", "valor": "valorEmissao", "situação": "statusFatura",
+}
+FORMATO_DATA_API = "ISO8601"
+
+# Um único cliente HTTP para a API da Neoenergia; o limitador é global ao processo, então o teto dele
+# já cobre os workers de todos os clientes em paralelo
+API_NEOENERGIA = ClienteHTTP(
+    max_conexoes=MAX_WORKERS_NEOENERGIA,
+    headers={"User-Agent": "Mozilla/5.0"},
+)
+
+# Durante o login só precisamos do DOM: imagens, fontes e analytics só atrasam a página.
+URLS_BLOQUEADAS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+]
+
+XPATH_BOTAO_ENTRAR = "/html/body/app-root/app-header/header/nav/div[1]/div/div/button/span[1]"
+XPATH_CAMPO_EMAIL = "/html/body/div[2]/div[2]/div/mat-dialog-container/app-dialog-login/mat-dialog-content/section/form/mat-horizontal-stepper/div[2]/div/div/mat-form-field[1]/div/div[1]/div[3]/input"
+XPATH_CAMPO_SENHA = "/html/body/div[2]/div[2]/div/mat-dialog-container/app-dialog-login/mat-dialog-content/section/form/mat-horizontal-stepper/div[2]/div/div/mat-form-field[2]/div/div[1]/div[3]/input"
+XPATH_BOTAO_CONFIRMAR = "/html/body/div[2]/div[2]/div/mat-dialog-container/app-dialog-login/mat-dialog-content/section/form/mat-horizontal-stepper/div[2]/div/div/div[3]/app-neo-button/button/div"
 
-def autenticar_drive():
-    SCOPES = ["https://www.googleapis.com/auth/drive"]
-    creds = service_account.Credentials.from_service_account_file(credentials_path, scopes=SCOPES)
-    return build("drive", "v3", credentials=creds)
+# --- FUNÇÕES AUXILIARES ---
 
 def configurar_driver():
     chrome_options = Options()
@@ -67,45 +96,49 @@ def configurar_driver():
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
     
     chrome_options.binary_location = "/usr/bin/chromium"
     servico = Service("/usr/bin/chromedriver")
     
-    return webdriver.Chrome(service=servico, options=chrome_options)
+    driver = webdriver.Chrome(service=servico, options=chrome_options)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": URLS_BLOQUEADAS})
+    return driver
+
+POOL_NAVEGADORES = PoolNavegadores(
+    configurar_driver, tamanho=MAX_NAVEGADORES,
+    origens=["https://agenciavirtual.neoenergia.com", "https://apineprd.neoenergia.com"]
+)
 
 def realizar_login_selenium_original(driver, login_user, login_password, cliente):
+    espera = WebDriverWait(driver, 30)
     try:
         print("  [LOG] Clicando no botão Entrar superior...")
-        login_button = driver.find_element(By.XPATH, "/html/body/app-root/app-header/header/nav/div[1]/div/div/button/span[1]")
-        login_button.click()
-        time.sleep(3)
+        espera.until(EC.element_to_be_clickable((By.XPATH, XPATH_BOTAO_ENTRAR))).click()
     except Exception:
         driver.save_screenshot(f"erro_botao_{cliente}.png")
         pass 
 
     try:
         print(f"  [LOG] Preenchendo CNPJ e Senha...")
-        email_field = driver.find_element(By.XPATH, "/html/body/div[2]/div[2]/div/mat-dialog-container/app-dialog-login/mat-dialog-content/section/form/mat-horizontal-stepper/div[2]/div/div/mat-form-field[1]/div/div[1]/div[3]/input")
+        email_field = espera.until(EC.visibility_of_element_located((By.XPATH, XPATH_CAMPO_EMAIL)))
         email_field.clear()
         email_field.send_keys(login_user)
-        time.sleep(1)
 
-        password_field = driver.find_element(By.XPATH, "/html/body/div[2]/div[2]/div/mat-dialog-container/app-dialog-login/mat-dialog-content/section/form/mat-horizontal-stepper/div[2]/div/div/mat-form-field[2]/div/div[1]/div[3]/input")
+        password_field = espera.until(EC.visibility_of_element_located((By.XPATH, XPATH_CAMPO_SENHA)))
         password_field.clear()
         password_field.send_keys(login_password)
-        time.sleep(1)
 
         print("  [LOG] Clicando em confirmar...")
-        submit_button = driver.find_element(By.XPATH, "/html/body/div[2]/div[2]/div/mat-dialog-container/app-dialog-login/mat-dialog-content/section/form/mat-horizontal-stepper/div[2]/div/div/div[3]/app-neo-button/button/div")
-        submit_button.click()
+        espera.until(EC.element_to_be_clickable((By.XPATH, XPATH_BOTAO_CONFIRMAR))).click()
         
-        time.sleep(2) 
-        
-        for i in range(20):
-            token = driver.execute_script("return window.localStorage.getItem('tokenNeSe');")
-            if token:
-                return token
-            time.sleep(1)
+        try:
+            return WebDriverWait(driver, 20, poll_frequency=0.25).until(
+                lambda d: d.execute_script("return window.localStorage.getItem('tokenNeSe');")
+            )
+        except TimeoutException:
+            pass
             
         print("  ❌ Token não veio. Tirando foto da tela...")
         driver.save_screenshot(f"erro_sem_token_{cliente}.png")
@@ -117,98 +150,13 @@ def realizar_login_selenium_original(driver, login_user, login_password, cliente
 
 # --- RESTANTE DO CÓDIGO (Igual ao seu) ---
 
-def extrair_faturas_e_flags(planilha_id, nome_aba):
-    try:
-        client = autenticar_google_sheets()
-        aba = client.open_by_key(planilha_id).worksheet(nome_aba)
-        dados = aba.get_values("C2:R")
-        resultado = {}
-        colunas = ['M', 'N', 'O', 'P', 'Q', 'R']
-        indices = [10, 11, 12, 13, 14, 15]
-        for linha in dados:
-            if len(linha) >= 1:
-                fatura = linha[0]
-                flags = {}
-                for coluna, indice in zip(colunas, indices):
-                    if indice < len(linha):
-                        flags[coluna] = (str(linha[indice]).upper() == 'TRUE')
-                    else:
-                        flags[coluna] = False
-                resultado[fatura] = flags
-        return resultado
-    except Exception:
-        return {}
-
-def restaurar_flags(planilha_id, nome_aba, flags_salvas):
-    try:
-        client = autenticar_google_sheets()
-        aba = client.open_by_key(planilha_id).worksheet(nome_aba)
-        faturas_atuais = aba.get_values("C2:C")
-        colunas = ['M', 'N', 'O', 'P', 'Q', 'R']
-        for coluna in colunas:
-            valores = []
-            for linha in faturas_atuais:
-                if linha and linha[0]:
-                    fatura = linha[0]
-                    val = flags_salvas.get(fatura, {}).get(coluna, False)
-                    valores.append([val])
-                else:
-                    valores.append([False])
-            if valores:
-                aba.update(f"{coluna}2:{coluna}{len(valores)+1}", valores, value_input_option='USER_ENTERED')
-    except Exception:
-        pass
-
-def escrever_no_google_sheets(df, planilha_id, nome_aba, intervalo="A2:G"):
-    client_sheets = autenticar_google_sheets()
-    planilha = client_sheets.open_by_key(planilha_id)
-    aba = planilha.worksheet(nome_aba)
-    aba.batch_clear([intervalo, "K2:K"])
-    dados = df.astype(str).values.tolist()
-    aba.update(intervalo, dados, value_input_option="USER_ENTERED")
-
-def atualizar_links_sheets(planilha_id, nome_aba, df_filtrado):
-    try:
-        client_sheets = autenticar_google_sheets()
-        planilha = client_sheets.open_by_key(planilha_id)
-        aba = planilha.worksheet(nome_aba)
-        col_numero_fatura = aba.col_values(3)[1:]
-        df_filtrado["numeroFatura"] = df_filtrado["numeroFatura"].astype(str).str.strip()
-        dict_links = dict(zip(df_filtrado["numeroFatura"], df_filtrado["link_drive"]))
-        col_j = [str(dict_links.get(f.strip(), "")) for f in col_numero_fatura]
-        if col_j:
-            aba.update(f"J2:J{len(col_j)+1}", [[l] for l in col_j], value_input_option='USER_ENTERED')
-    except Exception as e:
-        print(f"Erro ao atualizar links: {e}")
-
 def listar_arquivos_existentes(pasta_id):
-    client_drive = autenticar_drive()
-    arquivos_cache = {}
-    page_token = None
     try:
-        while True:
-            results = client_drive.files().list(
-                q=f"'{pasta_id}' in parents and trashed = false",
-                pageSize=1000,
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token
-            ).execute()
-            for f in results.get('files', []):
-                arquivos_cache[f['name']] = f['id']
-            page_token = results.get('nextPageToken')
-            if not page_token:
-                break
-        return arquivos_cache
-    except Exception:
+        return listar_pasta(pasta_id)
+    except Exception as e:
+        print(f"  ⚠️ Erro ao carregar índice do Drive: {e}")
         return {}
 
-def upload_para_drive_conteudo_pdf(conteudo_pdf, nome_arquivo_drive, pasta_id):
-    client_drive = autenticar_drive()
-    file_metadata = {"name": nome_arquivo_drive, "parents": [pasta_id]}
-    media = MediaInMemoryUpload(conteudo_pdf, mimetype="application/pdf")
-    arquivo = client_drive.files().create(body=file_metadata, media_body=media, fields="id").execute()
-    return arquivo.get("id")
-
 def buscar_links_drive(df, pasta_id=None):
     if "file_id" not in df.columns:
         df["link_drive"] = pd.NA
@@ -223,26 +171,101 @@ def buscar_links_drive(df, pasta_id=None):
 def baixar_pdf_fatura(numeroFatura, mesReferencia, codigo, tokenNeSe, protocolo_legado, login_user, cache_drive):
     nome_arquivo = f"{mesReferencia}_{codigo}_{numeroFatura}.pdf"
     if nome_arquivo in cache_drive:
+        contar("faturas", status="EXISTE")
         return numeroFatura, cache_drive[nome_arquivo], "EXISTE"
-    url = f"https://apineprd.neoenergia.com/multilogin/2.0.0/servicos/faturas/{numeroFatura}/pdf"
-    headers = {"Authorization": f"Bearer {tokenNeSe}", "Accept": "application/json", "User-Agent": "Mozilla/5.0"}
+    url = f"{URL_API}/multilogin/2.0.0/servicos/faturas/{numeroFatura}/pdf"
+    headers = {"Authorization": f"Bearer {tokenNeSe}", "Accept": "application/json"}
     params = {
         "codigo": codigo, "protocolo": protocolo_legado, "tipificacao": "1031607",
         "usuario": "WSO2_CONEXAO", "canalSolicitante": "AGC", "motivo": "10",
         "distribuidora": "COELBA", "regiao": "NE", "tipoPerfil": "1",
         "documento": login_user, "documentoSolicitante": login_user, "byPassActiv": ""
     }
+    # Download e upload são retentados (e limitados) separadamente: a vaga da Neoenergia não fica presa esperando o Drive
+    with medir("pdf_download"):
+        buffer = executar_com_retentativa(baixar_pdf_neoenergia, url, headers, params, endpoint="neoenergia")
+    with buffer:
+        contar("bytes", buffer.tamanho, servico="neoenergia", direcao="download")
+        indice = obter_indice()
+        # Mesmo conteúdo já guardado com outro nome (fatura reemitida, arquivo renomeado): só reaproveita o link
+        file_id = indice.buscar_por_hash(PASTA_DRIVE_ID, buffer.md5)
+        if file_id:
+            cache_drive[nome_arquivo] = file_id
+            indice.registrar_apelido(PASTA_DRIVE_ID, nome_arquivo, file_id)
+            contar("faturas", status="DUPLICADO")
+            return numeroFatura, file_id, "DUPLICADO"
+        with medir("pdf_upload"):
+            file_id = executar_com_retentativa(upload_stream_para_drive, buffer, nome_arquivo, PASTA_DRIVE_ID, endpoint="drive_upload")
+        contar("bytes", buffer.tamanho, servico="drive", direcao="upload")
+        indice.registrar(PASTA_DRIVE_ID, file_id, nome_arquivo, buffer.tamanho, buffer.md5, buffer.sha256)
+        cache_drive[nome_arquivo] = file_id 
+        contar("faturas", status="BAIXADO")
+        return numeroFatura, file_id, "BAIXADO"
+
+def baixar_pdf_neoenergia(url, headers, params):
+    """
+    O PDF vem em base64 dentro do JSON: decodificamos em blocos direto para um BufferPDF novo.
+    Falhas sobem como exceção classificada, para o executar_com_retentativa decidir se repete.
+    """
+    buffer = BufferPDF()
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=60)
-        if response.status_code == 200:
-            data = response.json()
-            if "fileData" in data:
-                pdf_bytes = base64.b64decode(data["fileData"])
-                file_id = upload_para_drive_conteudo_pdf(pdf_bytes, nome_arquivo, PASTA_DRIVE_ID)
-                cache_drive[nome_arquivo] = file_id 
-                return numeroFatura, file_id, "BAIXADO"
-    except: pass
-    return numeroFatura, None, "ERRO"
+        with API_NEOENERGIA.get(url, headers=headers, params=params, timeout=60, stream=True) as response:
+            if response.status_code != 200:
+                raise ErroTransferencia(
+                    categoria_por_status(response.status_code), f"HTTP {response.status_code}",
+                    status=response.status_code, retry_after=response.headers.get("Retry-After")
+                )
+            if not baixar_file_data(response, buffer):
+                raise ErroTransferencia(CONTEUDO, "resposta sem fileData")
+            if buffer.inicio(5) != b"%PDF-":
+                raise ErroTransferencia(CONTEUDO, "fileData não é um PDF")
+        return buffer
+    except BaseException:
+        buffer.close()
+        raise
+
+def buscar_faturas_uc(codigo, headers_api, login_user, protocolo):
+    params = {"codigo": codigo, "documento": login_user, "canalSolicitante": "AGC", "usuario": "WSO2_CONEXAO", "protocolo": protocolo, "byPassActiv": "X", "documentoSolicitante": login_user, "documentoCliente": login_user, "distribuidora": "COELBA", "tipoPerfil": "1"}
+    r_fat = API_NEOENERGIA.get(f"{URL_API}/multilogin/2.0.0/servicos/faturas/ucs/faturas", headers=headers_api, params=params, timeout=30)
+    # Qualquer resposta diferente de 200 é falha da consulta, não "UC sem faturas": a UC vai para
+    # falhas_uc, é reportada e as linhas dela na planilha são preservadas
+    if r_fat.status_code != 200:
+        raise ErroTransferencia(
+            categoria_por_status(r_fat.status_code), f"HTTP {r_fat.status_code}",
+            status=r_fat.status_code, retry_after=r_fat.headers.get("Retry-After")
+        )
+    return r_fat.json().get("faturas", [])
+
+def listar_faturas_ucs(codigos_uc, headers_api, login_user, protocolo):
+    """
+    Consulta as faturas de todas as UCs em paralelo (limitado pelo limitador da Neoenergia).
+    Retorna ({ coluna: [valores] } na ordem de codigos_uc, [(codigo, erro), ...]).
+    """
+    def consultar(codigo):
+        try:
+            faturas = executar_com_retentativa(buscar_faturas_uc, codigo, headers_api, login_user, protocolo, endpoint="neoenergia")
+            return codigo, faturas, None
+        except Exception as e:
+            return codigo, [], e
+
+    colunas = {coluna: [] for coluna in COLUNAS_FATURAS}
+    falhas = []
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS_NEOENERGIA, len(codigos_uc)))) as executor:
+        futuros = [submeter_com_contexto(executor, consultar, codigo) for codigo in codigos_uc]
+        for fut in futuros:
+            codigo, lista, erro = fut.result()
+            if erro is not None:
+                falhas.append((codigo, erro))
+                continue
+            if not lista:
+                # UC sem faturas continua aparecendo na planilha como uma linha "N/A"
+                for coluna in COLUNAS_FATURAS:
+                    colunas[coluna].append(codigo if coluna == "codigo_cliente" else "N/A")
+                continue
+            colunas["codigo_cliente"].extend([codigo] * len(lista))
+            for coluna, campo in CAMPOS_FATURA_API.items():
+                colunas[coluna].extend([f.get(campo, "N/A") for f in lista])
+    return colunas, falhas
 
 def preparar_dados_para_exportacao(df):
     # 1. Definimos o "peso" de cada status (A ordem das suas cores)
@@ -258,7 +281,7 @@ def preparar_dados_para_exportacao(df):
     df["status_ordenado"] = df["situação"].map(ordem_status).fillna(4)
     
     # Transforma o vencimento em formato de data real para ordenar cronologicamente
-    df["vencimento"] = pd.to_datetime(df["vencimento"], errors="coerce")
+    df["vencimento"] = pd.to_datetime(df["vencimento"], format="%Y-%m-%d", errors="coerce")
     
     # 2. O SEGREDO: Ordena PRIMEIRO pelo peso do Status, e SEGUNDO pelo Vencimento (A-Z)
     df = df.sort_values(by=["status_ordenado", "vencimento"])
@@ -268,7 +291,7 @@ def preparar_dados_para_exportacao(df):
     
     return df
 
-def processar_cliente(cliente, login_user, login_password, worksheet):
+def obter_token_selenium(cliente, login_user, login_password):
     MAX_TENTATIVAS_LOGIN = 3
     tentativa_atual = 1
     tokenNeSe = None
@@ -279,112 +302,194 @@ def processar_cliente(cliente, login_user, login_password, worksheet):
 
     while tentativa_atual <= MAX_TENTATIVAS_LOGIN:
         print(f"  [{cliente.upper()}] Tentativa {tentativa_atual}/{MAX_TENTATIVAS_LOGIN}...")
-        driver = configurar_driver()
         try:
-            driver.get("https://agenciavirtual.neoenergia.com/#/login")
-            time.sleep(4) 
-            WebDriverWait(driver, 30).until(lambda d: d.execute_script("return document.readyState") == "complete")
-            
-            bearer_token = realizar_login_selenium_original(driver, login_user, login_password, cliente)
+            # Uma exceção dentro do bloco descarta o navegador; sem erro ele volta limpo para o pool.
+            with medir("login_navegador"), POOL_NAVEGADORES.navegador() as driver:
+                driver.get(URL_LOGIN)
+                WebDriverWait(driver, 30).until(lambda d: d.execute_script("return document.readyState") == "complete")
+                bearer_token = realizar_login_selenium_original(driver, login_user, login_password, cliente)
+            contar("tentativas_login", resultado="token" if bearer_token else "sem_token")
             
             if bearer_token:
                 tokenNeSe = bearer_token.split(":")[1].split(",")[0].strip(' "{}')
                 print("  ✅ Login realizado!")
-                driver.quit()
                 break
             else:
                 print("  ⚠️ Token não obtido.")
         except Exception as e:
              print(f"  ⚠️ Erro na tentativa: {e}")
              
-        driver.quit()
         tentativa_atual += 1
         if tentativa_atual <= MAX_TENTATIVAS_LOGIN:
              time.sleep(5)
 
+    return tokenNeSe
+
+def buscar_ucs(tokenNeSe, login_user):
+    headers_api = {"User-Agent": "Mozilla/5.0", "Authorization": "Bearer " + tokenNeSe}
+    r_ucs = API_NEOENERGIA.get(f"{URL_API}/imoveis/1.1.0/clientes/{login_user}/ucs", 
+                        params={"documento": login_user, "canalSolicitante": "AGC", "distribuidora": "COELBA", "usuario": "WSO2_CONEXAO", "indMaisUcs": "X", "tipoPerfil": "1"}, 
+                        headers=headers_api, timeout=30)
+    # 429/5xx sobe como erro para o executar_com_retentativa repetir; 401/403 voltam para quem chamou decidir
+    if r_ucs.status_code == 429 or r_ucs.status_code >= 500:
+        r_ucs.raise_for_status()
+    return r_ucs
+
+def obter_token(cliente, login_user, login_password):
+    """
+    Retorna (token, resposta_ucs). Reaproveita o token salvo enquanto ele for aceito pela API;
+    a própria consulta de UCs serve de validação, então o token em cache não custa chamada extra.
+    """
+    tokenNeSe = carregar_token(cliente, login_user)
+    if tokenNeSe:
+        try:
+            r_ucs = executar_com_retentativa(buscar_ucs, tokenNeSe, login_user, endpoint="neoenergia")
+            if r_ucs.status_code == 200:
+                print("  ♻️ Token em cache reaproveitado, login no navegador dispensado.")
+                contar("login", origem="cache")
+                return tokenNeSe, r_ucs
+            print(f"  ⚠️ Token em cache não validado (HTTP {r_ucs.status_code}), refazendo login...")
+        except Exception as e:
+            print(f"  ⚠️ Não foi possível validar o token em cache: {e}")
+        invalidar_token(cliente, login_user)
+
+    tokenNeSe = obter_token_selenium(cliente, login_user, login_password)
+    contar("login", origem="navegador" if tokenNeSe else "falhou")
     if not tokenNeSe:
-        print(f"❌ Falha no login de {cliente}.")
-        return False
+        return None, None
+    salvar_token(cliente, login_user, tokenNeSe)
+    return tokenNeSe, None
+
+def imprimir_tempos_api():
+    for endpoint, r in API_NEOENERGIA.resumo_tempos(cliente_atual.get()).items():
+        print(f"  ⏱️ {endpoint}: {r['chamadas']} chamadas, {r['erros']} erros, média {r['media_s']:.2f}s, p95 {r['p95_s']:.2f}s")
+    API_NEOENERGIA.limpar_tempos(cliente_atual.get())
 
+def consultar_faturas_cliente(tokenNeSe, r_ucs, login_user):
+    """UCs, protocolo e faturas de todas as UCs. Retorna (colunas_faturas, protocolo, falhas_uc) ou None sem UCs."""
     print("  Obtendo dados de UCs e Faturas...")
     headers_api = {"User-Agent": "Mozilla/5.0", "Authorization": "Bearer " + tokenNeSe}
     
     try:
-        r_ucs = requests.get(f"https://apineprd.neoenergia.com/imoveis/1.1.0/clientes/{login_user}/ucs", 
-                             params={"documento": login_user, "canalSolicitante": "AGC", "distribuidora": "COELBA", "usuario": "WSO2_CONEXAO", "indMaisUcs": "X", "tipoPerfil": "1"}, 
-                             headers=headers_api, timeout=30)
+        if r_ucs is None:
+            with medir("ucs"):
+                r_ucs = executar_com_retentativa(buscar_ucs, tokenNeSe, login_user, endpoint="neoenergia")
+        if r_ucs.status_code != 200:
+            print(f"  ❌ Consulta de UCs falhou (HTTP {r_ucs.status_code}).")
+            return None
         codigos_uc = [uc['uc'] for uc in r_ucs.json().get("ucs", [])]
     except:
-        return False
+        return None
 
-    if not codigos_uc: return False
+    if not codigos_uc: return None
 
     try:
-        r_proto = requests.get("https://apineprd.neoenergia.com/protocolo/1.1.0/obterProtocolo",
-                               params={"distribuidora": "COEL", "canalSolicitante": "AGC", "documento": login_user, "codCliente": codigos_uc[0], "recaptchaAnl": "true", "regiao": "NE"},
-                               headers=headers_api, timeout=30)
+        with medir("protocolo"):
+            r_proto = API_NEOENERGIA.get(f"{URL_API}/protocolo/1.1.0/obterProtocolo",
+                                   params={"distribuidora": "COEL", "canalSolicitante": "AGC", "documento": login_user, "codCliente": codigos_uc[0], "recaptchaAnl": "true", "regiao": "NE"},
+                                   headers=headers_api, timeout=30)
         protocolo = r_proto.json().get('protocoloLegado')
     except: protocolo = None
 
-    dados_coletados = []
-    for codigo in codigos_uc:
-        try:
-            params = {"codigo": codigo, "documento": login_user, "canalSolicitante": "AGC", "usuario": "WSO2_CONEXAO", "protocolo": protocolo, "byPassActiv": "X", "documentoSolicitante": login_user, "documentoCliente": login_user, "distribuidora": "COELBA", "tipoPerfil": "1"}
-            r_fat = requests.get("https://apineprd.neoenergia.com/multilogin/2.0.0/servicos/faturas/ucs/faturas", headers=headers_api, params=params, timeout=30)
-            lista = r_fat.json().get("faturas", []) if r_fat.status_code == 200 else []
-            if lista:
-                for f in lista:
-                    dados_coletados.append({
-                        "codigo_cliente": codigo, "mesReferencia": f.get("mesReferencia", "N/A"), "numeroFatura": f.get("numeroFatura", "N/A"),
-                        "emissão": f.get("dataEmissao", "N/A"), "vencimento": f.get("dataVencimento", "N/A"),
-                        "valor": f.get("valorEmissao", "N/A").replace(".", ","), "situação": f.get("statusFatura", "N/A")
-                    })
-            else:
-                dados_coletados.append({"codigo_cliente": codigo, "vencimento": "N/A", "numeroFatura": "N/A", "situação": "N/A", "valor": "N/A", "emissão": "N/A", "mesReferencia": "N/A"})
-        except: pass
-
-    if not dados_coletados: return False
-
-    df_geral = pd.DataFrame(dados_coletados)
-    df_geral['vencimento'] = pd.to_datetime(df_geral['vencimento'], errors='coerce')
+    with medir("faturas_ucs"):
+        colunas_faturas, falhas_uc = listar_faturas_ucs(codigos_uc, headers_api, login_user, protocolo)
+    return colunas_faturas, protocolo, falhas_uc
+
+def processar_cliente(cliente, login_user, login_password, worksheet, retomar=False):
+    """
+    retomar=True continua a última execução deste cliente/aba que não terminou (retomada.py):
+    reaproveita a lista de faturas e os PDFs já resolvidos, e só faz login se ainda falta baixar algo.
+    """
+    # Cada etapa fica registrada em metricas.METRICAS (tempo por cliente, contadores, histogramas)
+    with medir("total"):
+        return _processar_cliente(cliente, login_user, login_password, worksheet, retomar)
+
+def _processar_cliente(cliente, login_user, login_password, worksheet, retomar):
+    execucao = obter_diario().abrir(f"extracao:{cliente}:{worksheet}", retomar)
+    listagem = execucao.etapa("faturas")
+    tokenNeSe = None
+    falhas_uc = []
+
+    if listagem:
+        colunas_faturas, protocolo = listagem["colunas"], listagem["protocolo"]
+        print(f"  ♻️ Retomando execução interrompida: {len(colunas_faturas['codigo_cliente'])} faturas já listadas, "
+              f"{len(execucao.itens())} PDFs já resolvidos.")
+    else:
+        with medir("login"):
+            tokenNeSe, r_ucs = obter_token(cliente, login_user, login_password)
+        if not tokenNeSe:
+            print(f"❌ Falha no login de {cliente}.")
+            return False
+
+        listagem = consultar_faturas_cliente(tokenNeSe, r_ucs, login_user)
+        if listagem is None: return False
+        colunas_faturas, protocolo, falhas_uc = listagem
+        for codigo, erro in falhas_uc:
+            print(f"  ⚠️ UC {codigo}: falha ao listar faturas ({erro})")
+
+        if not colunas_faturas["codigo_cliente"]: return False
+        # Lista incompleta (alguma UC falhou) não entra no diário: a retomada consulta tudo de novo
+        if not falhas_uc:
+            execucao.concluir_etapa("faturas", {"colunas": colunas_faturas, "protocolo": protocolo})
+
+    df_geral = pd.DataFrame(colunas_faturas, columns=COLUNAS_FATURAS)
+    df_geral['valor'] = df_geral['valor'].fillna("N/A").astype(str).str.replace(".", ",", regex=False)
+    df_geral['vencimento'] = pd.to_datetime(df_geral['vencimento'], format=FORMATO_DATA_API, errors='coerce')
     df_geral = df_geral.dropna(subset=['vencimento'])
     df_geral = df_geral[df_geral['vencimento'] >= pd.to_datetime("2024-12-01")]
     df_geral['vencimento'] = df_geral['vencimento'].dt.strftime('%Y-%m-%d').fillna('N/A')
     
-    print("  Atualizando Sheets...")
-    flags_salvas = extrair_faturas_e_flags(SPREADSHEET_ID, worksheet)
     df_ordenado = preparar_dados_para_exportacao(df_geral)
-    escrever_no_google_sheets(df_ordenado, SPREADSHEET_ID, worksheet)
-    df_ordenado["file_id"] = pd.NA
 
-    faturas_validas = df_ordenado[df_ordenado["numeroFatura"] != "N/A"].copy()
+    # Os workers só preenchem o dicionário; o DataFrame recebe tudo de uma vez no final.
+    # Cada PDF resolvido também vai para o diário, e na retomada só os que faltam são processados.
+    file_ids = execucao.itens()
+    faturas_validas = df_ordenado[df_ordenado["numeroFatura"] != "N/A"]
+    faturas_validas = faturas_validas[~faturas_validas["numeroFatura"].astype(str).isin(file_ids)]
+    falhas = []
     if not faturas_validas.empty:
-        cache_drive = listar_arquivos_existentes(PASTA_DRIVE_ID)
-        total = len(faturas_validas)
-        def processar_thread(row):
-            return baixar_pdf_fatura(row["numeroFatura"], row["mesReferencia"], row["codigo_cliente"], tokenNeSe, protocolo, login_user, cache_drive)
-        falhas = []
+        if tokenNeSe is None:
+            with medir("login"):
+                tokenNeSe, _ = obter_token(cliente, login_user, login_password)
+            if not tokenNeSe:
+                print(f"❌ Falha no login de {cliente}.")
+                return False
+        with medir("drive_indice"):
+            cache_drive = listar_arquivos_existentes(PASTA_DRIVE_ID)
+        tarefas = list(zip(faturas_validas["numeroFatura"], faturas_validas["mesReferencia"], faturas_validas["codigo_cliente"]))
+        def processar_thread(numero, mes, codigo):
+            return baixar_pdf_fatura(numero, mes, codigo, tokenNeSe, protocolo, login_user, cache_drive)
         concluidos = 0
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futu_map = {executor.submit(processar_thread, row): row for _, row in faturas_validas.iterrows()}
+        with medir("pdfs"), ThreadPoolExecutor(max_workers=MAX_WORKERS_NEOENERGIA) as executor:
+            futu_map = {submeter_com_contexto(executor, processar_thread, *t): t for t in tarefas}
             for fut in as_completed(futu_map):
                 concluidos += 1
                 try:
                     num, fid, status = fut.result()
                     if fid:
-                        with df_lock:
-                            df_ordenado["file_id"] = df_ordenado["file_id"].astype(object)
-                            df_ordenado.loc[df_ordenado["numeroFatura"] == num, "file_id"] = str(fid)
-                except:
-                    falhas.append(futu_map[fut])
+                        file_ids[str(num)] = str(fid)
+                        execucao.registrar_item(num, str(fid))
+                except Exception as e:
+                    falhas.append((futu_map[fut][0], getattr(e, "categoria", OUTRO), e))
+                    contar("faturas", status="ERRO", categoria=falhas[-1][1])
         if falhas:
-            with ThreadPoolExecutor(max_workers=3) as exc:
-                for row in falhas:
-                    exc.submit(processar_thread, row)
+            por_categoria = Counter(categoria for _, categoria, _ in falhas)
+            print(f"  ❌ {len(falhas)} faturas sem PDF: " + ", ".join(f"{c}={n}" for c, n in por_categoria.items()))
+            for numero, categoria, erro in falhas:
+                print(f"    - {numero} [{categoria}]: {erro}")
 
-    print("  Atualizando links...")
-    df_ordenado = buscar_links_drive(df_ordenado, PASTA_DRIVE_ID)
-    atualizar_links_sheets(SPREADSHEET_ID, worksheet, df_ordenado)
-    restaurar_flags(SPREADSHEET_ID, worksheet, flags_salvas)
+    df_ordenado["file_id"] = df_ordenado["numeroFatura"].astype(str).map(file_ids)
 
+    print("  Atualizando Sheets...")
+    df_ordenado = buscar_links_drive(df_ordenado, PASTA_DRIVE_ID)
+    with medir("sheets"):
+        # UCs que não listaram ficam com as linhas (link PAGO e flags) que já estavam na aba
+        sincronizar_planilha(SPREADSHEET_ID, worksheet, df_ordenado, [codigo for codigo, _ in falhas_uc])
+    # Planilha sincronizada é execução terminada, mesmo com faturas sem PDF: o diário só serve para
+    # retomar uma execução interrompida. A próxima lista tudo de novo (faturas novas, mudanças de
+    # situação) e as faturas que falharam são tentadas outra vez por não estarem no Drive.
+    execucao.concluir()
+
+    imprimir_tempos_api()
+    imprimir_limitadores()
     return True
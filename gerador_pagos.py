@@ -1,24 +1,24 @@
 import os
 import sys
-import io
 import time
+import hashlib
 import streamlit as st
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
+from collections import Counter
 
-# Bibliotecas de PDF e Imagem
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.colors import red
-from PyPDF2 import PdfReader, PdfWriter
+from marca_dagua import adicionar_marca_dagua, obter_pool_processos, PROCESSOS_MARCA_DAGUA
+from pipeline import Estagio, executar_pipeline, imprimir_metricas
 
 # Bibliotecas Google e Rede
 from dotenv import load_dotenv
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from clientes_google import obter_planilha, obter_drive
+from indice_drive import obter_indice, listar_pasta
+from retentativas import executar_com_retentativa
+from concorrencia import obter_limitador, imprimir_limitadores
+from metricas import medir, contar
+from retomada import obter_diario
 from googleapiclient.http import MediaInMemoryUpload
+from gspread.utils import absolute_range_name
 import requests
 
 # --- CONFIGURAÇÕES INICIAIS ---
@@ -30,9 +30,10 @@ else:
 env_path = os.path.join(base_path, ".env")
 load_dotenv(env_path)
 
-credentials_path = os.path.join(base_path, "credentials.json")
 SPREADSHEET_ID = "1Ut5Y0LstIP7nhv7Jzyywc7SS7ObIPlO-3yEg-J8Pp5o"
 PASTA_DRIVE_PAGO = "1kHvWYkoQyL2WnjKDhYGks1jsoTh7zZ1k"
+PASTA_DRIVE_FATURAS = "1wbPLpNj_h1i3nLCEhVx2vdYyDiIval-9"  # onde o extrator guarda os PDFs originais
+TAMANHO_LOTE_DRIVE = 100  # máximo de chamadas por requisição em lote da API do Drive
 
 print_lock = Lock()
 
@@ -40,222 +41,327 @@ def safe_print(*args, **kwargs):
     with print_lock:
         print(*args, **kwargs)
 
-# --- AUTENTICAÇÃO ---
-def autenticar_google_sheets():
-    scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-    creds = ServiceAccountCredentials.from_json_keyfile_name(credentials_path, scope)
-    return gspread.authorize(creds)
-
-def autenticar_drive():
-    SCOPES = ["https://www.googleapis.com/auth/drive"]
-    creds = service_account.Credentials.from_service_account_file(credentials_path, scopes=SCOPES)
-    return build("drive", "v3", credentials=creds)
-
-# --- OTIMIZAÇÃO 1: MARCA D'ÁGUA EM MEMÓRIA ---
-def criar_marca_dagua_cache():
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=letter)
-    c.setFillColor(red)
-    c.setFont("Helvetica-Bold", 120)
-    width, height = letter
-    c.saveState()
-    c.translate(width/2, height/2)
-    c.rotate(45)
-    c.setFillAlpha(0.3)
-    c.drawString(-120, 50, "PAGO")
-    c.drawString(-370, -50, "SOL ONLINE")
-    c.restoreState()
-    c.save()
-    buffer.seek(0)
-    return PdfReader(buffer).pages[0]
-
-MARCA_DAGUA_PAGE = criar_marca_dagua_cache()
-
-def adicionar_marca_dagua_rapida(pdf_bytes):
-    try:
-        reader = PdfReader(io.BytesIO(pdf_bytes))
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            page.merge_page(MARCA_DAGUA_PAGE)
-            writer.add_page(page)
-        
-        output_buffer = io.BytesIO()
-        writer.write(output_buffer)
-        return output_buffer.getvalue()
-    except Exception as e:
-        safe_print(f"❌ Erro ao adicionar marca d'água: {e}")
-        return None
-
 # --- OTIMIZAÇÃO 2: CACHE DE ARQUIVOS ---
 def mapear_arquivos_drive(pasta_id):
     safe_print("📂 Mapeando arquivos existentes no Drive...")
-    client_drive = autenticar_drive()
-    arquivos_cache = {}
-    page_token = None
-    
     try:
-        while True:
-            results = client_drive.files().list(
-                q=f"'{pasta_id}' in parents and trashed = false",
-                pageSize=1000,
-                fields="nextPageToken, files(id, name)",
-                pageToken=page_token
-            ).execute()
-            
-            for f in results.get('files', []):
-                arquivos_cache[f['name']] = f['id']
-                
-            page_token = results.get('nextPageToken')
-            if not page_token:
-                break
+        arquivos_cache = listar_pasta(pasta_id)
         safe_print(f"📂 Cache carregado: {len(arquivos_cache)} arquivos encontrados.")
         return arquivos_cache
     except Exception as e:
         safe_print(f"⚠️ Erro ao criar cache do Drive: {e}")
         return {}
 
-def obter_nome_arquivo_drive(client_drive, file_id):
+def extrair_file_id(link_drive):
     try:
-        res = client_drive.files().get(fileId=file_id, fields='name').execute()
-        return res.get('name')
-    except:
+        return link_drive.split("/file/d/")[1].split("/")[0]
+    except IndexError:
         return None
 
+def nome_arquivo_pago(file_id_original, nome_original):
+    if nome_original:
+        return f"pago_{os.path.splitext(nome_original)[0]}.pdf"
+    return f"pago_{file_id_original}.pdf"
+
+def resolver_nomes_drive(client_drive, file_ids):
+    """
+    { file_id: nome } de uma vez para todas as linhas: primeiro pelo índice da pasta de faturas
+    (já atualizado), e só os ids que não estão lá em lotes de até TAMANHO_LOTE_DRIVE chamadas por requisição HTTP.
+    """
+    nomes_indice = obter_indice().nomes_por_id(PASTA_DRIVE_FATURAS)
+    nomes = {fid: nomes_indice[fid] for fid in file_ids if fid in nomes_indice}
+    faltantes = [fid for fid in dict.fromkeys(file_ids) if fid not in nomes]
+
+    def receber(request_id, resposta, erro):
+        if erro is None:
+            nomes[request_id] = resposta.get("name")
+
+    for inicio in range(0, len(faltantes), TAMANHO_LOTE_DRIVE):
+        lote = client_drive.new_batch_http_request(callback=receber)
+        for fid in faltantes[inicio:inicio + TAMANHO_LOTE_DRIVE]:
+            lote.add(client_drive.files().get(fileId=fid, fields="id, name"), request_id=fid)
+        try:
+            executar_com_retentativa(lote.execute, endpoint="drive_download")
+        except Exception as e:
+            safe_print(f"⚠️ Falha ao consultar nomes no Drive: {e}")
+    return nomes
+
 def baixar_pdf_memoria(client_drive, file_id):
-    try:
-        request = client_drive.files().get_media(fileId=file_id)
-        return request.execute()
-    except:
-        return None
+    request = client_drive.files().get_media(fileId=file_id)
+    return executar_com_retentativa(request.execute, endpoint="drive_download")
 
 def upload_simples(client_drive, conteudo_pdf, nome_arquivo, pasta_id):
     file_metadata = {"name": nome_arquivo, "parents": [pasta_id]}
     media = MediaInMemoryUpload(conteudo_pdf, mimetype="application/pdf")
-    arquivo = client_drive.files().create(body=file_metadata, media_body=media, fields="id").execute()
-    return arquivo.get("id")
+    requisicao = client_drive.files().create(body=file_metadata, media_body=media, fields="id")
+    return executar_com_retentativa(requisicao.execute, endpoint="drive_upload").get("id")
 
-# --- PROCESSAMENTO INDIVIDUAL ---
-def processar_linha_thread(dados):
-    linha_num, link_drive, cache_drive, client_drive_local = dados
-    
-    if "drive.google.com" not in link_drive:
-        return linha_num, None 
-    
-    try:
-        try:
-            file_id_original = link_drive.split("/file/d/")[1].split("/")[0]
-        except:
-            return linha_num, None
-
-        nome_original = obter_nome_arquivo_drive(client_drive_local, file_id_original)
-        if nome_original:
-            nome_sem_ext = os.path.splitext(nome_original)[0]
-            nome_arquivo_pago = f"pago_{nome_sem_ext}.pdf"
-        else:
-            nome_arquivo_pago = f"pago_{file_id_original}.pdf"
+def estado_link_pago(indice, nomes_pago, file_id_original, nome_pago, link_pago):
+    """
+    "ok" se o link da coluna K aponta para um PAGO que ainda existe e foi gerado do original atual;
+    "original_alterado" se foi gerado de outra versão do original; "pendente" nos demais casos.
+    """
+    id_pago = extrair_file_id(link_pago) if link_pago and "drive.google.com" in link_pago else None
+    if not id_pago or id_pago not in nomes_pago:
+        return "pendente"
+    md5_origem = indice.origem_do_derivado(PASTA_DRIVE_PAGO, id_pago)
+    if md5_origem:
+        md5_atual = indice.md5_do_arquivo(PASTA_DRIVE_FATURAS, file_id_original)
+        return "ok" if md5_atual in (None, md5_origem) else "original_alterado"
+    # PAGO gerado antes de existir o registro de derivados: confere pelo nome
+    return "ok" if nomes_pago[id_pago] == nome_pago else "pendente"
 
-        if nome_arquivo_pago in cache_drive:
-            file_id_final = cache_drive[nome_arquivo_pago]
-            link_final = f"https://drive.google.com/file/d/{file_id_final}/view"
-            safe_print(f"⚡ [Linha {linha_num}] Já existe no cache.")
-            return linha_num, link_final
+class ResultadosComDiario(dict):
+    """{ (aba, linha): link } que grava cada link no diário da aba assim que ele sai, para a retomada."""
 
-        safe_print(f"⬇️ [Linha {linha_num}] Baixando...")
-        pdf_bytes = baixar_pdf_memoria(client_drive_local, file_id_original)
-        if not pdf_bytes or not pdf_bytes.startswith(b'%PDF'):
-            return linha_num, None
+    def __init__(self, execucoes):
+        super().__init__()
+        self.execucoes = execucoes
 
-        pdf_com_marca = adicionar_marca_dagua_rapida(pdf_bytes)
-        if not pdf_com_marca:
-            return linha_num, None
+    def __setitem__(self, chave, link):
+        super().__setitem__(chave, link)
+        aba, linha = chave
+        self.execucoes[aba].registrar_item(linha, link)
 
-        safe_print(f"⬆️ [Linha {linha_num}] Fazendo Upload...")
-        file_id_novo = upload_simples(client_drive_local, pdf_com_marca, nome_arquivo_pago, PASTA_DRIVE_PAGO)
-        
-        cache_drive[nome_arquivo_pago] = file_id_novo
-        
-        link_final = f"https://drive.google.com/file/d/{file_id_novo}/view"
-        return linha_num, link_final
+# --- ESTÁGIOS DO PIPELINE ---
+# download (threads, I/O) -> marca d'água (processos, CPU) -> upload (threads, I/O), ligados por filas limitadas.
+# Cada item é um dict que vai ganhando campos; o link final vai para `resultados[(aba, linha)]`.
 
-    except Exception as e:
-        safe_print(f"❌ Erro thread linha {linha_num}: {e}")
-        return linha_num, None
+def _rotulo(item):
+    return f"[{item['aba']} | Linha {item['linha']}]"
 
-# --- PROCESSAMENTO DA ABA ---
-def processar_aba_otimizada(nome_aba, cache_drive):
-    client_sheets = autenticar_google_sheets()
-    try:
-        aba = client_sheets.open_by_key(SPREADSHEET_ID).worksheet(nome_aba)
-    except:
-        safe_print(f"❌ Aba {nome_aba} não encontrada.")
-        return 0, 0
+def etapa_download(item, resultados):
+    # Mesmo original (pelo md5) já tem cópia PAGO com outro nome: reaproveita sem baixar nada
+    indice = obter_indice()
+    md5_origem = indice.md5_do_arquivo(PASTA_DRIVE_FATURAS, item["file_id_original"])
+    file_id_existente = indice.buscar_derivado(md5_origem, PASTA_DRIVE_PAGO)
+    if file_id_existente:
+        safe_print(f"⚡ {_rotulo(item)} Mesmo conteúdo já marcado como PAGO.")
+        contar("pago_linhas", cliente=item["cliente"], status="reaproveitada")
+        resultados[(item["aba"], item["linha"])] = f"https://drive.google.com/file/d/{file_id_existente}/view"
+        return None
 
-    coluna_j = aba.col_values(10)
-    tarefas = []
-    
-    for i, link in enumerate(coluna_j):
-        linha_num = i + 1
-        if linha_num == 1: continue 
-        if link and "drive.google.com" in link:
-             tarefas.append((linha_num, link))
-    
-    if not tarefas:
-        safe_print(f"⚠️ Nenhum link na aba {nome_aba}")
-        return 0, 0
+    safe_print(f"⬇️ {_rotulo(item)} Baixando...")
+    with medir("pago_download", item["cliente"]):
+        pdf_bytes = baixar_pdf_memoria(obter_drive(), item["file_id_original"])
+    contar("bytes", len(pdf_bytes or b""), cliente=item["cliente"], servico="drive", direcao="download")
+    if not pdf_bytes or not pdf_bytes.startswith(b'%PDF'):
+        safe_print(f"❌ {_rotulo(item)} Arquivo original não é um PDF.")
+        contar("pago_linhas", cliente=item["cliente"], status="erro")
+        return None
+    item["md5_origem"] = md5_origem or hashlib.md5(pdf_bytes).hexdigest()
+    item["pdf"] = pdf_bytes
+    return item
 
-    safe_print(f"🚀 Iniciando {len(tarefas)} tarefas na aba {nome_aba}...")
+def etapa_marca_dagua(item):
+    # A thread só espera: o trabalho de CPU roda no pool de processos
+    with medir("pago_marca_dagua", item["cliente"]):
+        item["pdf"] = obter_pool_processos().submit(adicionar_marca_dagua, item["pdf"]).result()
+    return item
 
-    resultados = {}
-    
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        def wrapper(t):
-            local_drive = autenticar_drive() 
-            return processar_linha_thread((t[0], t[1], cache_drive, local_drive))
+def etapa_upload(item, resultados, cache_drive):
+    nome_pago, pdf_com_marca = item["nome_pago"], item["pdf"]
+    indice = obter_indice()
+    md5_pago = hashlib.md5(pdf_com_marca).hexdigest()
+    file_id_novo = indice.buscar_por_hash(PASTA_DRIVE_PAGO, md5_pago)
+    if file_id_novo:
+        safe_print(f"⚡ {_rotulo(item)} PDF idêntico já está na pasta PAGO.")
+        contar("pago_linhas", cliente=item["cliente"], status="reaproveitada")
+    else:
+        safe_print(f"⬆️ {_rotulo(item)} Fazendo Upload...")
+        with medir("pago_upload", item["cliente"]):
+            file_id_novo = upload_simples(obter_drive(), pdf_com_marca, nome_pago, PASTA_DRIVE_PAGO)
+        contar("bytes", len(pdf_com_marca), cliente=item["cliente"], servico="drive", direcao="upload")
+        contar("pago_linhas", cliente=item["cliente"], status="gerada")
+        indice.registrar(PASTA_DRIVE_PAGO, file_id_novo, nome_pago, len(pdf_com_marca), md5_pago)
 
-        futures = [executor.submit(wrapper, t) for t in tarefas]
-        
-        for future in as_completed(futures):
-            l_num, link_res = future.result()
-            if link_res:
-                resultados[l_num] = link_res
-    
-    if resultados:
-        safe_print("💾 Salvando todos os links pagos na planilha...")
-        updates = []
-        for l_num, link in resultados.items():
-            updates.append({
-                'range': f'K{l_num}',
-                'values': [[link]]
-            })
-        
-        if updates:
-            aba.batch_update(updates, value_input_option='USER_ENTERED')
-            
-    return len(resultados), len(tarefas) - len(resultados)
+    cache_drive[nome_pago] = file_id_novo
+    indice.registrar_derivado(item["md5_origem"], PASTA_DRIVE_PAGO, file_id_novo)
+    resultados[(item["aba"], item["linha"])] = f"https://drive.google.com/file/d/{file_id_novo}/view"
+    return None
+
+def processar_pipeline(tarefas, resultados, cache_drive, clientes_por_aba=None):
+    """
+    tarefas: [(aba, linha, file_id_original, nome_pago), ...] de todas as abas juntas.
+    clientes_por_aba só dá nome aos itens nas métricas (sem ele, vale o nome da aba).
+    """
+    clientes_por_aba = clientes_por_aba or {}
+    estagios = [
+        Estagio("download", lambda item: etapa_download(item, resultados),
+                workers=obter_limitador("drive_download").maximo, profundidade=len(tarefas)),
+        # Fila curta antes da CPU: PDFs baixados esperando processo ocupam memória
+        Estagio("marca_dagua", etapa_marca_dagua, workers=PROCESSOS_MARCA_DAGUA, profundidade=2 * PROCESSOS_MARCA_DAGUA),
+        Estagio("upload", lambda item: etapa_upload(item, resultados, cache_drive),
+                workers=obter_limitador("drive_upload").maximo, profundidade=2 * PROCESSOS_MARCA_DAGUA),
+    ]
+    def ao_falhar(estagio, item, erro):
+        safe_print(f"❌ {_rotulo(item)} Erro em {estagio}: {erro}")
+        contar("pago_linhas", cliente=item["cliente"], status="erro", estagio=estagio)
+    itens = (
+        {"aba": aba, "linha": linha, "file_id_original": fid, "nome_pago": nome, "cliente": clientes_por_aba.get(aba, aba)}
+        for aba, linha, fid, nome in tarefas
+    )
+    metricas = executar_pipeline(itens, estagios, ao_falhar)
+    imprimir_metricas(metricas, safe_print)
+    return metricas
+
+# --- LEITURA DAS ABAS ---
+def ler_links_abas(planilha, nomes_abas):
+    """
+    Uma única leitura (values_batch_get) de G e J:K de todas as abas.
+    Retorna { aba: [(linha, file_id_original, link_pago, situação), ...] } só com linhas que têm link de fatura.
+    """
+    faixas = []
+    for nome_aba in nomes_abas:
+        faixas += [absolute_range_name(nome_aba, "G2:G"), absolute_range_name(nome_aba, "J2:K")]
+    resposta = executar_com_retentativa(planilha.values_batch_get, faixas, endpoint="sheets")
+    blocos = [faixa.get("values", []) for faixa in resposta.get("valueRanges", [])]
+
+    links_por_aba = {}
+    for n, nome_aba in enumerate(nomes_abas):
+        coluna_g, colunas_jk = blocos[2 * n], blocos[2 * n + 1]
+        links = []
+        for i, valores in enumerate(colunas_jk):
+            link = valores[0] if valores else ""
+            if link and "drive.google.com" in link:
+                link_pago = valores[1] if len(valores) > 1 else ""
+                situacao = coluna_g[i][0] if i < len(coluna_g) and coluna_g[i] else ""
+                links.append((i + 2, extrair_file_id(link), link_pago, situacao))
+        links_por_aba[nome_aba] = links
+    return links_por_aba
+
+def planejar_aba(nome_aba, links, nomes, nomes_pago, cache_drive, resultados, cliente=None, links_retomados=None):
+    """
+    Separa as linhas da aba em já prontas (puladas), só falta o link (vai direto para resultados) e tarefas.
+    links_retomados: { linha: link } que uma execução interrompida gerou mas não chegou a gravar na planilha.
+    """
+    cliente = cliente or nome_aba
+    links_retomados = links_retomados or {}
+    indice = obter_indice()
+    tarefas = []
+    puladas = retomadas = 0
+    por_situacao = Counter()
+    for linha_num, file_id_original, link_pago, situacao in links:
+        if not file_id_original:
+            continue
+        nome_pago = nome_arquivo_pago(file_id_original, nomes.get(file_id_original))
+        estado = estado_link_pago(indice, nomes_pago, file_id_original, nome_pago, link_pago)
+        if estado == "ok":
+            puladas += 1
+            continue
+        # Mesmo teste da coluna K: o link do diário só vale se ainda é o PAGO do original desta linha
+        link_retomado = links_retomados.get(linha_num)
+        if link_retomado and estado_link_pago(indice, nomes_pago, file_id_original, nome_pago, link_retomado) == "ok":
+            resultados[(nome_aba, linha_num)] = link_retomado
+            retomadas += 1
+            continue
+        por_situacao[situacao or "sem situação"] += 1
+        # Original alterado: o PAGO com o mesmo nome é da versão antiga e não serve
+        if estado != "original_alterado" and nome_pago in cache_drive:
+            resultados[(nome_aba, linha_num)] = f"https://drive.google.com/file/d/{cache_drive[nome_pago]}/view"
+        else:
+            tarefas.append((nome_aba, linha_num, file_id_original, nome_pago))
+
+    prontas = sum(1 for aba, _ in resultados if aba == nome_aba)
+    contar("pago_linhas", puladas, cliente=cliente, status="pulada")
+    contar("pago_linhas", retomadas, cliente=cliente, status="retomada")
+    contar("pago_linhas", prontas - retomadas, cliente=cliente, status="so_link")
+    safe_print(f"⏭️ {nome_aba}: {puladas} linhas já têm link PAGO válido, {prontas} só precisam do link"
+               f"{f' ({retomadas} da execução interrompida)' if retomadas else ''}, {len(tarefas)} na fila.")
+    if por_situacao:
+        safe_print("📋 Pendentes por situação: " + ", ".join(f"{s}: {n}" for s, n in por_situacao.most_common()))
+    return tarefas, puladas
 
 # --- FUNÇÃO PRINCIPAL CHAMADA PELO STREAMLIT ---
-# --- FUNÇÃO PRINCIPAL CHAMADA PELO STREAMLIT ---
-def processar_faturas_pagas(clientes_dict):
+def processar_faturas_pagas(clientes_dict, retomar=False):
     """
     Agora recebe um dicionário mastigado: { 'blue': 'Controle_Blue...', 'DNA': 'Controle_DNA...' }
+    Todas as abas são lidas juntas, alimentam um único pipeline e são gravadas numa única escrita.
+    Cada link gerado vai para o diário da aba (retomada.py); com retomar=True, os links de uma execução
+    que caiu antes da escrita são reaproveitados em vez de refeitos.
     """
+    with medir("pago_total"):
+        return _processar_faturas_pagas(clientes_dict, retomar)
+
+def _processar_faturas_pagas(clientes_dict, retomar):
     start_time = time.time()
-    cache_drive = mapear_arquivos_drive(PASTA_DRIVE_PAGO)
+    with medir("pago_drive_indice"):
+        cache_drive = mapear_arquivos_drive(PASTA_DRIVE_PAGO)
+        # Índice dos originais: fornece o md5 de cada fatura sem precisar baixá-la
+        mapear_arquivos_drive(PASTA_DRIVE_FATURAS)
     
     resultados_finais = {}
-    
+    with medir("pago_leitura_planilha"):
+        planilha = executar_com_retentativa(obter_planilha, SPREADSHEET_ID, endpoint="sheets")
+        abas_existentes = {aba.title for aba in executar_com_retentativa(planilha.worksheets, endpoint="sheets")}
+    abas_cliente = {}
     for cliente, worksheet_nome in clientes_dict.items():
         nome_maiusculo = cliente.upper()
-        safe_print(f"\n--- Processando PAGO para: {nome_maiusculo} ---")
-        
         if not worksheet_nome:
             safe_print(f"⚠️ Worksheet não encontrada para {nome_maiusculo}")
             resultados_finais[nome_maiusculo] = "Falha (Aba não configurada)"
-            continue
-            
-        suc, falha = processar_aba_otimizada(worksheet_nome, cache_drive)
-        resultados_finais[nome_maiusculo] = f"✅ Sucesso: {suc} | ❌ Falhas: {falha}"
+        elif worksheet_nome not in abas_existentes:
+            safe_print(f"❌ Aba {worksheet_nome} não encontrada.")
+            resultados_finais[nome_maiusculo] = "Falha (Aba não encontrada)"
+        else:
+            abas_cliente[nome_maiusculo] = worksheet_nome
+    if not abas_cliente:
+        return resultados_finais
+
+    # Rótulo das métricas de cada aba: o primeiro cliente que aponta para ela
+    clientes_por_aba = {}
+    for cliente, worksheet_nome in clientes_dict.items():
+        clientes_por_aba.setdefault(worksheet_nome, cliente)
+
+    with medir("pago_leitura_planilha"):
+        links_por_aba = ler_links_abas(planilha, list(dict.fromkeys(abas_cliente.values())))
+    # Nomes resolvidos em bloco: checar se o PAGO já existe vira consulta em memória, sem chamada por linha
+    todos_ids = [l[1] for links in links_por_aba.values() for l in links if l[1]]
+    with medir("pago_nomes_drive"):
+        nomes = resolver_nomes_drive(obter_drive(), todos_ids)
+    nomes_pago = obter_indice().nomes_por_id(PASTA_DRIVE_PAGO)
+
+    execucoes = {aba: obter_diario().abrir(f"pago:{aba}", retomar) for aba in links_por_aba}
+    links_retomados = {
+        aba: {int(linha): link for linha, link in execucao.itens().items()}
+        for aba, execucao in execucoes.items() if execucao.retomada
+    }
+    resultados = ResultadosComDiario(execucoes)
+    tarefas, puladas = [], {}
+    for nome_aba, links in links_por_aba.items():
+        if not links:
+            safe_print(f"⚠️ Nenhum link na aba {nome_aba}")
+        tarefas_aba, puladas[nome_aba] = planejar_aba(
+            nome_aba, links, nomes, nomes_pago, cache_drive, resultados, clientes_por_aba.get(nome_aba),
+            links_retomados.get(nome_aba),
+        )
+        tarefas += tarefas_aba
+
+    if tarefas:
+        safe_print(f"\n🚀 Iniciando {len(tarefas)} tarefas de {len(links_por_aba)} abas...")
+        with medir("pago_pipeline"):
+            processar_pipeline(tarefas, resultados, cache_drive, clientes_por_aba)
+
+    if resultados:
+        safe_print("💾 Salvando todos os links pagos na planilha...")
+        with medir("pago_escrita_planilha"):
+            executar_com_retentativa(planilha.values_batch_update, {
+                "valueInputOption": "USER_ENTERED",
+                "data": [
+                    {"range": absolute_range_name(aba, f"K{linha}"), "values": [[link]]}
+                    for (aba, linha), link in sorted(resultados.items())
+                ],
+            }, endpoint="sheets")
+    # Links gravados na planilha: a próxima execução já os encontra na coluna K
+    for execucao in execucoes.values():
+        execucao.concluir()
+
+    for nome_maiusculo, nome_aba in abas_cliente.items():
+        links = links_por_aba[nome_aba]
+        suc = sum(1 for aba, _ in resultados if aba == nome_aba)
+        falha = len(links) - suc - puladas[nome_aba]
+        resultados_finais[nome_maiusculo] = f"✅ Sucesso: {suc} | ❌ Falhas: {falha} | ⏭️ Já prontas: {puladas[nome_aba]}"
         
+    imprimir_limitadores()
     safe_print(f"\n🏁 Concluído em {time.time() - start_time:.2f} segundos.")
-    return resultados_finais
+    return {cliente.upper(): resultados_finais[cliente.upper()] for cliente in clientes_dict}
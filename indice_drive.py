@@ -0,0 +1,227 @@
+import os
+import time
+import sqlite3
+from threading import Lock, RLock
+
+from googleapiclient.errors import HttpError
+
+from clientes_google import obter_drive
+from retentativas import executar_com_retentativa
+
+# --- CONFIGURAÇÃO ---
+PASTA_CACHE = os.getenv("HUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+ARQUIVO_INDICE = os.path.join(PASTA_CACHE, "indice_drive.sqlite3")
+
+CAMPOS_ARQUIVO = "id, name, size, md5Checksum, sha256Checksum"
+CAMPOS_MUDANCAS = f"nextPageToken, newStartPageToken, changes(fileId, removed, file({CAMPOS_ARQUIVO}, parents, trashed))"
+
+
+class IndiceDrive:
+    """
+    Índice local (SQLite) de nome -> id, tamanho, md5 e sha256 dos arquivos de cada pasta do Drive.
+    A primeira carga lista a pasta inteira; depois disso só o feed de mudanças do Drive é lido,
+    a partir do page token salvo, então o custo de inicialização não cresce com a pasta.
+    """
+
+    def __init__(self, caminho=ARQUIVO_INDICE, fabrica_drive=obter_drive):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._fabrica_drive = fabrica_drive
+        self._lock = RLock()
+        # Vários processos (uma execução por aba, mais o PAGO) gravam no mesmo arquivo ao mesmo tempo
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        with self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS arquivos (
+                    pasta_id TEXT NOT NULL, file_id TEXT NOT NULL, nome TEXT NOT NULL,
+                    tamanho INTEGER, md5 TEXT, sha256 TEXT,
+                    PRIMARY KEY (pasta_id, file_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_arquivos_nome ON arquivos (pasta_id, nome);
+                CREATE TABLE IF NOT EXISTS pastas (
+                    pasta_id TEXT PRIMARY KEY, page_token TEXT NOT NULL, atualizado_em REAL NOT NULL
+                );
+                -- Arquivo gerado a partir de outro (ex.: cópia PAGO), pelo md5 do original
+                CREATE TABLE IF NOT EXISTS derivados (
+                    md5_origem TEXT NOT NULL, pasta_id TEXT NOT NULL, file_id TEXT NOT NULL,
+                    PRIMARY KEY (md5_origem, pasta_id)
+                );
+                -- Nome que não foi subido porque o conteúdo já estava na pasta com outro nome (duplicado por hash)
+                CREATE TABLE IF NOT EXISTS apelidos (
+                    pasta_id TEXT NOT NULL, nome TEXT NOT NULL, file_id TEXT NOT NULL,
+                    PRIMARY KEY (pasta_id, nome)
+                );
+            """)
+            # Índices criados antes da coluna sha256 existir
+            colunas = [c[1] for c in self._conexao.execute("PRAGMA table_info(arquivos)")]
+            if "sha256" not in colunas:
+                self._conexao.execute("ALTER TABLE arquivos ADD COLUMN sha256 TEXT")
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_arquivos_md5 ON arquivos (pasta_id, md5)")
+
+    # --- SINCRONIZAÇÃO COM O DRIVE ---
+
+    def atualizar(self, pasta_id):
+        with self._lock:
+            linha = self._conexao.execute("SELECT page_token FROM pastas WHERE pasta_id = ?", (pasta_id,)).fetchone()
+            if linha is None:
+                return self._carga_completa(pasta_id)
+            try:
+                return self._aplicar_mudancas(pasta_id, linha[0])
+            except HttpError as e:
+                # Token expirado/inválido: recomeça com uma listagem completa
+                if e.resp.status not in (400, 404, 410):
+                    raise
+                return self._carga_completa(pasta_id)
+
+    def _carga_completa(self, pasta_id):
+        drive = self._fabrica_drive()
+        # O token é obtido antes da listagem para nenhuma mudança feita durante ela se perder
+        token = drive.changes().getStartPageToken().execute()["startPageToken"]
+        arquivos, page_token = [], None
+        while True:
+            resultado = drive.files().list(
+                q=f"'{pasta_id}' in parents and trashed = false",
+                pageSize=1000,
+                fields=f"nextPageToken, files({CAMPOS_ARQUIVO})",
+                pageToken=page_token
+            ).execute()
+            arquivos.extend(resultado.get("files", []))
+            page_token = resultado.get("nextPageToken")
+            if not page_token:
+                break
+        with self._conexao:
+            self._conexao.execute("DELETE FROM arquivos WHERE pasta_id = ?", (pasta_id,))
+            for f in arquivos:
+                self._upsert(pasta_id, f["id"], f["name"], f.get("size"), f.get("md5Checksum"), f.get("sha256Checksum"))
+            self._salvar_token(pasta_id, token)
+        return len(arquivos)
+
+    def _aplicar_mudancas(self, pasta_id, token):
+        drive = self._fabrica_drive()
+        alteracoes = 0
+        while True:
+            resultado = drive.changes().list(
+                pageToken=token, pageSize=1000, includeRemoved=True, spaces="drive", fields=CAMPOS_MUDANCAS
+            ).execute()
+            with self._conexao:
+                for mudanca in resultado.get("changes", []):
+                    arquivo = mudanca.get("file") or {}
+                    na_pasta = pasta_id in arquivo.get("parents", [])
+                    if mudanca.get("removed") or arquivo.get("trashed") or not na_pasta:
+                        cursor = self._conexao.execute(
+                            "DELETE FROM arquivos WHERE pasta_id = ? AND file_id = ?", (pasta_id, mudanca["fileId"])
+                        )
+                        alteracoes += cursor.rowcount
+                    else:
+                        self._upsert(
+                            pasta_id, arquivo["id"], arquivo["name"], arquivo.get("size"),
+                            arquivo.get("md5Checksum"), arquivo.get("sha256Checksum")
+                        )
+                        alteracoes += 1
+                token = resultado.get("nextPageToken") or resultado.get("newStartPageToken")
+                self._salvar_token(pasta_id, token)
+            if "newStartPageToken" in resultado:
+                return alteracoes
+
+    def _salvar_token(self, pasta_id, token):
+        self._conexao.execute("INSERT OR REPLACE INTO pastas VALUES (?, ?, ?)", (pasta_id, token, time.time()))
+
+    def _upsert(self, pasta_id, file_id, nome, tamanho=None, md5=None, sha256=None):
+        self._conexao.execute(
+            "INSERT OR REPLACE INTO arquivos (pasta_id, file_id, nome, tamanho, md5, sha256) VALUES (?, ?, ?, ?, ?, ?)",
+            (pasta_id, file_id, nome, _inteiro(tamanho), md5, sha256)
+        )
+
+    # --- CONSULTAS ---
+
+    def registrar(self, pasta_id, file_id, nome, tamanho=None, md5=None, sha256=None):
+        """Inclui na hora um arquivo que acabamos de subir (o feed de mudanças confirma depois)."""
+        with self._lock, self._conexao:
+            self._upsert(pasta_id, file_id, nome, tamanho, md5, sha256)
+
+    def registrar_apelido(self, pasta_id, nome, file_id):
+        """Guarda que `nome` é o arquivo `file_id` da pasta (conteúdo idêntico), para não baixar de novo."""
+        with self._lock, self._conexao:
+            self._conexao.execute("INSERT OR REPLACE INTO apelidos VALUES (?, ?, ?)", (pasta_id, nome, file_id))
+
+    def mapa_nomes(self, pasta_id):
+        """{ nome: file_id } dos arquivos da pasta mais os apelidos cujo arquivo ainda está lá (nome real ganha)."""
+        with self._lock:
+            apelidos = self._conexao.execute(
+                "SELECT p.nome, p.file_id FROM apelidos p JOIN arquivos a ON a.pasta_id = p.pasta_id AND a.file_id = p.file_id "
+                "WHERE p.pasta_id = ?", (pasta_id,)
+            ).fetchall()
+            linhas = self._conexao.execute(
+                "SELECT nome, file_id FROM arquivos WHERE pasta_id = ? ORDER BY rowid", (pasta_id,)
+            ).fetchall()
+        return {**dict(apelidos), **dict(linhas)}
+
+    def buscar_por_hash(self, pasta_id, md5):
+        """Id de um arquivo da pasta com exatamente este conteúdo, se existir."""
+        if not md5:
+            return None
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT file_id FROM arquivos WHERE pasta_id = ? AND md5 = ? LIMIT 1", (pasta_id, md5)
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def md5_do_arquivo(self, pasta_id, file_id):
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT md5 FROM arquivos WHERE pasta_id = ? AND file_id = ?", (pasta_id, file_id)
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def registrar_derivado(self, md5_origem, pasta_id, file_id):
+        if not md5_origem:
+            return
+        with self._lock, self._conexao:
+            self._conexao.execute("INSERT OR REPLACE INTO derivados VALUES (?, ?, ?)", (md5_origem, pasta_id, file_id))
+
+    def buscar_derivado(self, md5_origem, pasta_id):
+        """Id do arquivo já gerado na pasta a partir de um original com este md5 (se ainda existir lá)."""
+        if not md5_origem:
+            return None
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT d.file_id FROM derivados d JOIN arquivos a ON a.pasta_id = d.pasta_id AND a.file_id = d.file_id "
+                "WHERE d.md5_origem = ? AND d.pasta_id = ?", (md5_origem, pasta_id)
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def origem_do_derivado(self, pasta_id, file_id):
+        """md5 do original a partir do qual o arquivo foi gerado (None se não foi registrado)."""
+        with self._lock:
+            linha = self._conexao.execute(
+                "SELECT md5_origem FROM derivados WHERE pasta_id = ? AND file_id = ?", (pasta_id, file_id)
+            ).fetchone()
+        return linha[0] if linha else None
+
+    def nomes_por_id(self, pasta_id):
+        with self._lock:
+            linhas = self._conexao.execute("SELECT file_id, nome FROM arquivos WHERE pasta_id = ?", (pasta_id,)).fetchall()
+        return dict(linhas)
+
+
+def _inteiro(valor):
+    return int(valor) if valor not in (None, "") else None
+
+
+# --- ÍNDICE COMPARTILHADO NO PROCESSO ---
+_indice = None
+_lock_indice = Lock()
+
+def obter_indice():
+    global _indice
+    with _lock_indice:
+        if _indice is None:
+            _indice = IndiceDrive()
+        return _indice
+
+def listar_pasta(pasta_id):
+    """{ nome: file_id } da pasta, atualizado pelo feed de mudanças do Drive."""
+    indice = obter_indice()
+    executar_com_retentativa(indice.atualizar, pasta_id, endpoint="drive_download")
+    return indice.mapa_nomes(pasta_id)
@@ -0,0 +1,174 @@
+import io
+import os
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.colors import red
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NullObject, StreamObject,
+)
+
+# Aplicar a marca é CPU puro (PyPDF2): roda em processos separados para escalar com os núcleos
+PROCESSOS_MARCA_DAGUA = int(os.getenv("PROCESSOS_MARCA_DAGUA", str(os.cpu_count() or 1)))
+
+# --- MARCA D'ÁGUA ---
+# O carimbo é desenhado uma vez por tamanho de página e entra no PDF como um Form XObject compartilhado:
+# cada página só ganha uma referência a ele ("/MarcaPago_WxH Do"), sem copiar conteúdo nem recursos.
+_ISOLAR_INICIO = b"q\n"
+
+def criar_marca_dagua_cache(largura=letter[0], altura=letter[1]):
+    """Página de overlay do tamanho pedido; o desenho é o de sempre (pensado para carta), escalado."""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(largura, altura))
+    c.setFillColor(red)
+    c.setFont("Helvetica-Bold", 120)
+    escala = min(largura / letter[0], altura / letter[1])
+    c.saveState()
+    c.translate(largura/2, altura/2)
+    c.scale(escala, escala)
+    c.rotate(45)
+    c.setFillAlpha(0.3)
+    c.drawString(-120, 50, "PAGO")
+    c.drawString(-370, -50, "SOL ONLINE")
+    c.restoreState()
+    c.save()
+    buffer.seek(0)
+    return PdfReader(buffer).pages[0]
+
+_overlays = {}
+
+def _overlay(largura, altura):
+    # Cache por processo: o mesmo tamanho de página aparece em praticamente todas as faturas
+    chave = (largura, altura)
+    if chave not in _overlays:
+        _overlays[chave] = criar_marca_dagua_cache(largura, altura)
+    return _overlays[chave]
+
+
+class _Carimbador:
+    """Cria (uma vez por PdfWriter) os objetos compartilhados e carimba páginas já adicionadas a ele."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._formularios = {}
+        self._chamadas = {}
+        self._isolar = writer._add_object(_stream(_ISOLAR_INICIO))
+
+    def _formulario(self, largura, altura):
+        chave = (largura, altura)
+        if chave not in self._formularios:
+            overlay = _overlay(largura, altura)
+            form = _stream(overlay.get_contents().get_data()).flate_encode()
+            form.update({
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Form"),
+                NameObject("/BBox"): ArrayObject([FloatObject(0), FloatObject(0), FloatObject(largura), FloatObject(altura)]),
+                NameObject("/Resources"): overlay["/Resources"].get_object().clone(self.writer),
+            })
+            nome = NameObject(f"/MarcaPago_{largura:g}x{altura:g}".replace(".", "_"))
+            self._formularios[chave] = (nome, self.writer._add_object(form))
+        return self._formularios[chave]
+
+    def carimbar(self, pagina):
+        caixa = pagina.mediabox
+        x0, y0 = round(float(caixa.left), 2), round(float(caixa.bottom), 2)
+        largura, altura = round(float(caixa.width), 2), round(float(caixa.height), 2)
+        nome, ref_form = self._formulario(largura, altura)
+
+        if "/Resources" not in pagina:
+            pagina[NameObject("/Resources")] = DictionaryObject()
+        recursos = pagina["/Resources"].get_object()
+        if "/XObject" not in recursos:
+            recursos[NameObject("/XObject")] = DictionaryObject()
+        recursos["/XObject"].get_object()[nome] = ref_form
+
+        chave = (nome, x0, y0)
+        if chave not in self._chamadas:
+            # Fecha o "q" posto antes do conteúdo original: o carimbo não herda cm/cores da página
+            self._chamadas[chave] = self.writer._add_object(_stream(f"Q\nq 1 0 0 1 {x0:g} {y0:g} cm {nome} Do Q\n".encode()))
+        conteudo = pagina.get("/Contents")
+        if conteudo is None:
+            originais = []
+        elif isinstance(conteudo.get_object(), ArrayObject):
+            originais = list(conteudo.get_object())
+        else:
+            originais = [conteudo]
+        pagina[NameObject("/Contents")] = ArrayObject([self._isolar, *originais, self._chamadas[chave]])
+
+
+def _stream(dados):
+    stream = DecodedStreamObject()
+    stream.set_data(dados)
+    return stream
+
+
+def comprimir_objetos_identicos(writer):
+    """
+    Streams idênticos (fontes, imagens, logos repetidos página a página) passam a ser um só objeto:
+    as referências apontam para o primeiro e o duplicado vira null (mantém a numeração da tabela xref).
+    O PyPDF2 3.0 não tem isso pronto (o pypdf 4 tem compress_identical_objects).
+    """
+    objetos = writer._objects
+    while True:
+        vistos, trocas = {}, {}
+        for i, obj in enumerate(objetos):
+            if isinstance(obj, StreamObject):
+                chave = (obj._data, repr(sorted((k, repr(v)) for k, v in obj.items() if k != "/Length")))
+                if chave in vistos:
+                    trocas[i + 1] = vistos[chave]
+                else:
+                    vistos[chave] = i + 1
+        if not trocas:
+            return
+        for obj in objetos:
+            _trocar_referencias(obj, trocas, writer)
+        for idnum in trocas:
+            objetos[idnum - 1] = NullObject()
+
+
+def _trocar_referencias(obj, trocas, writer):
+    if isinstance(obj, DictionaryObject):
+        itens = obj.items()
+    elif isinstance(obj, ArrayObject):
+        itens = enumerate(obj)
+    else:
+        return
+    for chave, valor in list(itens):
+        if isinstance(valor, IndirectObject):
+            if valor.idnum in trocas:
+                obj[chave] = IndirectObject(trocas[valor.idnum], 0, writer)
+        else:
+            _trocar_referencias(valor, trocas, writer)
+
+
+def adicionar_marca_dagua(pdf_bytes):
+    """Retorna o PDF com "PAGO" em todas as páginas. Erros de PDF inválido sobem para quem chamou."""
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    writer = PdfWriter()
+    carimbador = _Carimbador(writer)
+    for page in reader.pages:
+        carimbador.carimbar(writer.add_page(page))
+    comprimir_objetos_identicos(writer)
+    output_buffer = io.BytesIO()
+    writer.write(output_buffer)
+    return output_buffer.getvalue()
+
+# --- POOL DE PROCESSOS ---
+_pool = None
+_lock_pool = Lock()
+
+def obter_pool_processos():
+    """Pool compartilhado; "spawn" porque o processo principal tem threads (Streamlit, workers de I/O)."""
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESSOS_MARCA_DAGUA, mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import contextlib
+from bisect import bisect_left
+from datetime import datetime
+from threading import Lock
+from collections import defaultdict
+
+from agendador import cliente_atual
+
+# --- CONFIGURAÇÃO ---
+PASTA_CACHE = os.getenv("HUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+PASTA_METRICAS = os.path.join(PASTA_CACHE, "metricas")
+
+# Limites (segundos) dos baldes do histograma de cada etapa; o último balde é +Inf
+LIMITES_HISTOGRAMA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PREFIXO_PROMETHEUS = "hub"
+SEM_CLIENTE = "geral"   # trabalho compartilhado por todos os clientes (índice do Drive, leitura única das abas)
+
+
+class Histograma:
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        self.n = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        self.baldes[bisect_left(LIMITES_HISTOGRAMA, segundos)] += 1
+        self.n += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        """Aproximado pelo limite superior do balde (o máximo real, se cair no +Inf)."""
+        if not self.n:
+            return 0.0
+        alvo, acumulado = p / 100 * self.n, 0
+        for limite, contagem in zip(LIMITES_HISTOGRAMA, self.baldes):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(limite, self.maximo)
+        return self.maximo
+
+    def resumo(self):
+        return {
+            "n": self.n, "total_s": self.soma, "media_s": self.soma / self.n if self.n else 0.0,
+            "p50_s": self.percentil(50), "p95_s": self.percentil(95), "max_s": self.maximo,
+            "baldes": dict(zip([*map(str, LIMITES_HISTOGRAMA), "+Inf"], self.baldes)),
+        }
+
+
+class Metricas:
+    """
+    Duração por etapa (histograma) e contadores, separados por cliente. O cliente vem do
+    contexto da thread (agendador.cliente_atual) quando não é informado.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.inicio = time.time()
+            self._etapas = defaultdict(Histograma)     # (cliente, etapa) -> Histograma
+            self._contadores = defaultdict(float)      # (nome, cliente, ((rótulo, valor), ...)) -> total
+
+    @staticmethod
+    def _cliente(cliente):
+        return str(cliente or cliente_atual.get() or SEM_CLIENTE)
+
+    def observar(self, etapa, segundos, cliente=None):
+        cliente = self._cliente(cliente)
+        with self._lock:
+            self._etapas[(cliente, etapa)].observar(segundos)
+
+    def contar(self, nome, valor=1, cliente=None, **rotulos):
+        chave = (nome, self._cliente(cliente), tuple(sorted((k, str(v)) for k, v in rotulos.items())))
+        with self._lock:
+            self._contadores[chave] += valor
+
+    @contextlib.contextmanager
+    def medir(self, etapa, cliente=None):
+        """Cronometra o bloco como uma ocorrência da etapa; exceções contam em "erros_etapa" e sobem."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.contar("erros_etapa", cliente=cliente, etapa=etapa)
+            raise
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio, cliente)
+
+    # --- CONSULTA E EXPORTAÇÃO ---
+
+    def tabela_etapas(self):
+        """[{cliente, etapa, n, total_s, media_s, p50_s, p95_s, max_s}, ...] ordenado por cliente e etapa."""
+        with self._lock:
+            itens = sorted(self._etapas.items())
+            linhas = []
+            for (cliente, etapa), histograma in itens:
+                resumo = histograma.resumo()
+                del resumo["baldes"]
+                linhas.append({"cliente": cliente, "etapa": etapa, **resumo})
+            return linhas
+
+    def tabela_contadores(self):
+        with self._lock:
+            return [
+                {"nome": nome, "cliente": cliente, **dict(rotulos), "valor": valor}
+                for (nome, cliente, rotulos), valor in sorted(self._contadores.items())
+            ]
+
+    def instantaneo(self):
+        with self._lock:
+            etapas = defaultdict(dict)
+            for (cliente, etapa), histograma in sorted(self._etapas.items()):
+                etapas[cliente][etapa] = histograma.resumo()
+            inicio = self.inicio
+        return {
+            "inicio": datetime.fromtimestamp(inicio).isoformat(timespec="seconds"),
+            "duracao_s": time.time() - inicio,
+            "etapas": dict(etapas),
+            "contadores": self.tabela_contadores(),
+        }
+
+    def prometheus(self):
+        """Formato texto do Prometheus (para node_exporter textfile ou pushgateway)."""
+        nome_hist = f"{PREFIXO_PROMETHEUS}_etapa_segundos"
+        linhas = [f"# HELP {nome_hist} Duração de cada etapa por cliente.", f"# TYPE {nome_hist} histogram"]
+        with self._lock:
+            etapas = sorted(self._etapas.items())
+            contadores = sorted(self._contadores.items())
+        for (cliente, etapa), h in etapas:
+            rotulos = {"cliente": cliente, "etapa": etapa}
+            acumulado = 0
+            for limite, contagem in zip([*map(str, LIMITES_HISTOGRAMA), "+Inf"], h.baldes):
+                acumulado += contagem
+                linhas.append(f"{nome_hist}_bucket{_rotulos({**rotulos, 'le': limite})} {acumulado}")
+            linhas.append(f"{nome_hist}_sum{_rotulos(rotulos)} {h.soma:.6f}")
+            linhas.append(f"{nome_hist}_count{_rotulos(rotulos)} {h.n}")
+        tipo_emitido = set()
+        for (nome, cliente, rotulos), valor in contadores:
+            metrica = f"{PREFIXO_PROMETHEUS}_{nome}_total"
+            if metrica not in tipo_emitido:
+                tipo_emitido.add(metrica)
+                linhas.append(f"# TYPE {metrica} counter")
+            linhas.append(f"{metrica}{_rotulos({'cliente': cliente, **dict(rotulos)})} {valor:g}")
+        return "\n".join(linhas) + "\n"
+
+    def exportar(self, nome_execucao, pasta=PASTA_METRICAS):
+        """Grava <nome>_<data>.json e .prom na pasta de métricas e retorna os dois caminhos."""
+        os.makedirs(pasta, exist_ok=True)
+        base = os.path.join(pasta, f"{nome_execucao}_{datetime.now():%Y%m%d_%H%M%S}")
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(self.instantaneo(), f, indent=2, ensure_ascii=False)
+        with open(f"{base}.prom", "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        return f"{base}.json", f"{base}.prom"
+
+
+def _rotulos(rotulos):
+    def escapar(valor):
+        return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in rotulos.items()) + "}"
+
+
+# Registro único do processo, como os limitadores e disjuntores
+METRICAS = Metricas()
+medir = METRICAS.medir
+contar = METRICAS.contar
+
+
+def carregar_tabelas(caminho_json):
+    """(linhas por etapa, contadores) de um arquivo gravado por exportar, no formato de tabela_etapas/tabela_contadores."""
+    with open(caminho_json, encoding="utf-8") as f:
+        dados = json.load(f)
+    etapas = [
+        {"cliente": cliente, "etapa": etapa, **{k: v for k, v in resumo.items() if k != "baldes"}}
+        for cliente, por_etapa in dados["etapas"].items() for etapa, resumo in por_etapa.items()
+    ]
+    return etapas, dados["contadores"]
@@ -0,0 +1,96 @@
+import time
+from queue import Queue
+from threading import Thread, Lock
+
+_FIM = object()
+
+
+class Estagio:
+    """
+    Um estágio do pipeline: `workers` threads consomem a fila de entrada (limitada a `profundidade`
+    itens, o que segura os estágios anteriores quando este atrasa) e passam o retorno de `funcao`
+    ao próximo estágio. Retornar None encerra o item ali.
+    """
+
+    def __init__(self, nome, funcao, workers, profundidade):
+        self.nome = nome
+        self.funcao = funcao
+        self.workers = max(1, workers)
+        self.fila = Queue(maxsize=max(1, profundidade))
+        self.processados = 0
+        self.erros = 0
+        self.em_andamento = 0
+        self.pico_em_andamento = 0
+        self.pico_fila = 0
+        self.tempo_ocupado = 0.0
+        self._lock = Lock()
+
+    def colocar(self, item):
+        self.fila.put(item)
+        with self._lock:
+            self.pico_fila = max(self.pico_fila, self.fila.qsize())
+
+    def _executar(self, proximo, ao_falhar):
+        while True:
+            item = self.fila.get()
+            if item is _FIM:
+                return
+            with self._lock:
+                self.em_andamento += 1
+                self.pico_em_andamento = max(self.pico_em_andamento, self.em_andamento)
+            inicio = time.perf_counter()
+            try:
+                saida = self.funcao(item)
+            except Exception as e:
+                saida = None
+                with self._lock:
+                    self.erros += 1
+                if ao_falhar:
+                    ao_falhar(self.nome, item, e)
+            with self._lock:
+                self.em_andamento -= 1
+                self.processados += 1
+                self.tempo_ocupado += time.perf_counter() - inicio
+            if saida is not None and proximo is not None:
+                proximo.colocar(saida)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "processados": self.processados, "erros": self.erros, "workers": self.workers,
+                "pico_em_andamento": self.pico_em_andamento, "pico_fila": self.pico_fila,
+                "tempo_medio": self.tempo_ocupado / self.processados if self.processados else 0.0,
+            }
+
+
+def executar_pipeline(itens, estagios, ao_falhar=None):
+    """
+    Passa os itens pelos estágios em sequência. Cada estágio é encerrado depois que o anterior
+    terminou, então nada fica para trás na fila. ao_falhar(nome_estagio, item, erro) é chamado
+    para cada exceção (o item é descartado).
+    """
+    threads = []
+    for i, estagio in enumerate(estagios):
+        proximo = estagios[i + 1] if i + 1 < len(estagios) else None
+        threads.append([
+            Thread(target=estagio._executar, args=(proximo, ao_falhar), name=f"{estagio.nome}-{n}", daemon=True)
+            for n in range(estagio.workers)
+        ])
+        for t in threads[-1]:
+            t.start()
+
+    for item in itens:
+        estagios[0].colocar(item)
+    for estagio, grupo in zip(estagios, threads):
+        for _ in grupo:
+            estagio.fila.put(_FIM)
+        for t in grupo:
+            t.join()
+    return {e.nome: e.metricas() for e in estagios}
+
+
+def imprimir_metricas(metricas, escrever=print):
+    for nome, m in metricas.items():
+        escrever(f"  📊 {nome}: {m['processados']} itens ({m['erros']} erros), {m['workers']} workers, "
+                 f"pico {m['pico_em_andamento']} em andamento, fila máx {m['pico_fila']}, "
+                 f"{m['tempo_medio']:.2f}s por item")
@@ -0,0 +1,81 @@
+import queue
+import atexit
+from threading import Lock, Semaphore
+from contextlib import contextmanager
+
+
+class PoolNavegadores:
+    """
+    Mantém instâncias do Chromium aquecidas entre clientes.
+    O tamanho do pool é também o limite de navegadores abertos ao mesmo tempo.
+    """
+
+    def __init__(self, fabrica, tamanho=1, origens=()):
+        self._fabrica = fabrica
+        self._origens = list(origens)
+        self._livres = queue.LifoQueue()
+        self._vagas = Semaphore(max(1, tamanho))
+        self._todos = set()
+        self._lock = Lock()
+        atexit.register(self.encerrar)
+
+    def _criar(self):
+        driver = self._fabrica()
+        with self._lock:
+            self._todos.add(driver)
+        return driver
+
+    def _descartar(self, driver):
+        with self._lock:
+            self._todos.discard(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _limpar(self, driver):
+        # Zera cookies e storage para a próxima conta não herdar a sessão anterior.
+        try:
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+            for origem in self._origens:
+                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origem, "storageTypes": "all"})
+            driver.get("about:blank")
+            return True
+        except Exception:
+            return False
+
+    @contextmanager
+    def navegador(self):
+        self._vagas.acquire()
+        driver = None
+        sucesso = False
+        try:
+            while driver is None:
+                try:
+                    driver = self._livres.get_nowait()
+                except queue.Empty:
+                    driver = self._criar()
+                    break
+                try:
+                    driver.current_url  # navegador ainda responde?
+                except Exception:
+                    self._descartar(driver)
+                    driver = None
+            yield driver
+            sucesso = True
+        finally:
+            if driver is not None:
+                if sucesso and self._limpar(driver):
+                    self._livres.put(driver)
+                else:
+                    self._descartar(driver)
+            self._vagas.release()
+
+    def encerrar(self):
+        while True:
+            try:
+                driver = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(driver)
@@ -0,0 +1,179 @@
+import time
+import random
+from threading import Lock
+
+import requests
+from gspread.exceptions import APIError
+from googleapiclient.errors import HttpError
+
+from concorrencia import obter_limitador
+from metricas import contar
+
+# --- CATEGORIAS DE ERRO ---
+AUTENTICACAO = "autenticacao"   # token recusado: repetir não adianta
+LIMITE = "limite"               # 429 / cota do Google
+SERVIDOR = "servidor"           # 5xx
+CONTEUDO = "conteudo"           # resposta sem PDF, JSON truncado
+REDE = "rede"                   # timeout, conexão caiu
+OUTRO = "outro"
+
+RETENTAVEIS = {LIMITE, SERVIDOR, CONTEUDO, REDE}
+# Só estes contam para abrir o disjuntor: indicam que o serviço do outro lado está sofrendo
+SINAIS_SOBRECARGA = {LIMITE, SERVIDOR}
+
+MOTIVOS_LIMITE_GOOGLE = ("ratelimitexceeded", "userratelimitexceeded", "quotaexceeded", "sharingratelimitexceeded")
+
+
+class ErroTransferencia(Exception):
+    def __init__(self, categoria, mensagem, status=None, retry_after=None):
+        super().__init__(mensagem)
+        self.categoria = categoria
+        self.status = status
+        self.retry_after = retry_after
+
+
+def categoria_por_status(status):
+    if status == 429:
+        return LIMITE
+    if status in (401, 403):
+        return AUTENTICACAO
+    if status >= 500:
+        return SERVIDOR
+    return OUTRO
+
+
+def _segundos_retry_after(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def classificar_erro(erro):
+    """Retorna (categoria, segundos de Retry-After ou None)."""
+    if isinstance(erro, ErroTransferencia):
+        return erro.categoria, _segundos_retry_after(erro.retry_after)
+    if isinstance(erro, HttpError):
+        status = int(erro.resp.status)
+        if status == 403 and any(m in str(erro).lower() for m in MOTIVOS_LIMITE_GOOGLE):
+            return LIMITE, None
+        return categoria_por_status(status), _segundos_retry_after(erro.resp.get("retry-after"))
+    if isinstance(erro, APIError):
+        status = erro.response.status_code
+        if status == 403 and any(m in str(erro).lower() for m in MOTIVOS_LIMITE_GOOGLE + ("quota exceeded",)):
+            return LIMITE, None
+        return categoria_por_status(status), _segundos_retry_after(erro.response.headers.get("Retry-After"))
+    if isinstance(erro, requests.HTTPError) and erro.response is not None:
+        return categoria_por_status(erro.response.status_code), _segundos_retry_after(erro.response.headers.get("Retry-After"))
+    if isinstance(erro, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return REDE, None
+    if isinstance(erro, ValueError):   # inclui JSONDecodeError e base64 inválido
+        return CONTEUDO, None
+    return OUTRO, None
+
+
+def espera_backoff(tentativa, base=1.0, teto=30.0):
+    """Backoff exponencial com jitter completo."""
+    return random.uniform(0, min(teto, base * (2 ** tentativa)))
+
+
+# --- DISJUNTOR ---
+
+class Disjuntor:
+    """
+    Circuit breaker por endpoint. Depois de `limite_falhas` sinais de sobrecarga seguidos ele abre
+    e todos os workers daquele endpoint esperam a pausa antes de tentar de novo; a primeira
+    chamada depois da pausa decide se fecha ou se abre outra vez (com pausa maior).
+    """
+
+    def __init__(self, nome, limite_falhas=5, pausa=15.0, pausa_maxima=120.0):
+        self.nome = nome
+        self.limite_falhas = limite_falhas
+        self.pausa_base = pausa
+        self.pausa_maxima = pausa_maxima
+        self.falhas_seguidas = 0
+        self.aberturas = 0
+        self._pausa = pausa
+        self._reabre_em = 0.0
+        self._lock = Lock()
+
+    @property
+    def aberto(self):
+        return time.monotonic() < self._reabre_em
+
+    def aguardar(self):
+        while True:
+            with self._lock:
+                restante = self._reabre_em - time.monotonic()
+            if restante <= 0:
+                return
+            time.sleep(min(restante, 1.0))
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas_seguidas = 0
+            self._pausa = self.pausa_base
+
+    def registrar_falha(self, categoria, retry_after=None):
+        if categoria not in SINAIS_SOBRECARGA:
+            return
+        with self._lock:
+            self.falhas_seguidas += 1
+            if retry_after or self.falhas_seguidas >= self.limite_falhas:
+                # O servidor disse quanto esperar: respeita isso sem escalar a pausa própria
+                pausa = retry_after or self._pausa
+                novo_fim = time.monotonic() + pausa
+                if novo_fim > self._reabre_em:
+                    self._reabre_em = novo_fim
+                    self.aberturas += 1
+                    print(f"  🔌 {self.nome}: serviço sobrecarregado, pausando workers por {pausa:.0f}s")
+                if not retry_after:
+                    self._pausa = min(self._pausa * 2, self.pausa_maxima)
+                self.falhas_seguidas = 0
+
+
+_disjuntores = {}
+_lock_disjuntores = Lock()
+
+def obter_disjuntor(endpoint):
+    with _lock_disjuntores:
+        if endpoint not in _disjuntores:
+            _disjuntores[endpoint] = Disjuntor(endpoint)
+        return _disjuntores[endpoint]
+
+
+# --- EXECUÇÃO COM RETENTATIVA ---
+
+def executar_com_retentativa(funcao, *args, endpoint, tentativas=3, base=1.0, teto=30.0, **kwargs):
+    """
+    Chama funcao(*args, **kwargs) respeitando o disjuntor e o limite de concorrência do endpoint
+    e repetindo erros transitórios. A vaga do limitador só fica ocupada durante a chamada, nunca no backoff.
+    Erros que já esgotaram as tentativas numa chamada interna (ex.: upload do Drive dentro do
+    download da Neoenergia) sobem direto, sem serem repetidos de novo nem contados neste endpoint.
+    """
+    disjuntor = obter_disjuntor(endpoint)
+    limitador = obter_limitador(endpoint)
+    for tentativa in range(tentativas):
+        disjuntor.aguardar()
+        limitador.adquirir()
+        inicio = time.perf_counter()
+        try:
+            resultado = funcao(*args, **kwargs)
+        except Exception as e:
+            if getattr(e, "retentativas_esgotadas", False):
+                limitador.liberar()
+                raise
+            categoria, retry_after = classificar_erro(e)
+            limitador.liberar(sobrecarga=categoria in SINAIS_SOBRECARGA)
+            disjuntor.registrar_falha(categoria, retry_after)
+            if categoria not in RETENTAVEIS or tentativa == tentativas - 1:
+                e.retentativas_esgotadas = True
+                e.categoria = categoria
+                contar("falhas", endpoint=endpoint, categoria=categoria)
+                raise
+            contar("retentativas", endpoint=endpoint, categoria=categoria)
+            time.sleep(max(espera_backoff(tentativa, base, teto), retry_after or 0))
+        else:
+            limitador.liberar(time.perf_counter() - inicio)
+            disjuntor.registrar_sucesso()
+            return resultado
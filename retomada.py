@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import sqlite3
+from threading import Lock, RLock
+
+# --- CONFIGURAÇÃO ---
+PASTA_CACHE = os.getenv("HUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+ARQUIVO_DIARIO = os.path.join(PASTA_CACHE, "retomada.sqlite3")
+# Diário mais velho que isso não é retomado: a lista de faturas e a planilha já podem ter mudado
+VALIDADE_DIARIO_S = float(os.getenv("RETOMADA_VALIDADE_HORAS", "12")) * 3600
+
+
+class DiarioRetomada:
+    """
+    Diário durável (SQLite) do que cada execução já concluiu: etapas inteiras (ex.: lista de faturas)
+    e o resultado de cada item (ex.: file_id de cada fatura, link PAGO de cada linha). Tudo é gravado
+    na hora em que acontece, então uma execução que cai no meio pode ser retomada de onde parou.
+    """
+
+    def __init__(self, caminho=ARQUIVO_DIARIO):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = RLock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        with self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS execucoes (
+                    chave TEXT PRIMARY KEY, iniciado_em REAL NOT NULL, concluido_em REAL
+                );
+                CREATE TABLE IF NOT EXISTS etapas (
+                    chave TEXT NOT NULL, etapa TEXT NOT NULL, valor TEXT NOT NULL,
+                    PRIMARY KEY (chave, etapa)
+                );
+                CREATE TABLE IF NOT EXISTS itens (
+                    chave TEXT NOT NULL, item TEXT NOT NULL, valor TEXT NOT NULL,
+                    PRIMARY KEY (chave, item)
+                );
+            """)
+
+    def abrir(self, chave, retomar=False):
+        """
+        Diário da execução `chave` (ex.: "extracao:blue:Controle_Blue"). Com retomar=True e um diário
+        inacabado e ainda válido, continua dele; nos demais casos começa um diário vazio.
+        """
+        with self._lock, self._conexao:
+            linha = self._conexao.execute(
+                "SELECT iniciado_em, concluido_em FROM execucoes WHERE chave = ?", (chave,)
+            ).fetchone()
+            if retomar and linha and linha[1] is None and time.time() - linha[0] < VALIDADE_DIARIO_S:
+                return Execucao(self, chave, retomada=True)
+            self._conexao.execute("DELETE FROM etapas WHERE chave = ?", (chave,))
+            self._conexao.execute("DELETE FROM itens WHERE chave = ?", (chave,))
+            self._conexao.execute("INSERT OR REPLACE INTO execucoes VALUES (?, ?, NULL)", (chave, time.time()))
+        return Execucao(self, chave, retomada=False)
+
+    def _ler(self, sql, parametros):
+        with self._lock:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def _gravar(self, sql, parametros):
+        with self._lock, self._conexao:
+            self._conexao.execute(sql, parametros)
+
+
+class Execucao:
+    """Uma execução dentro do diário. Valores são gravados como JSON."""
+
+    def __init__(self, diario, chave, retomada):
+        self._diario = diario
+        self.chave = chave
+        self.retomada = retomada
+
+    def etapa(self, nome):
+        """Valor salvo da etapa concluída, ou None se ela ainda não terminou."""
+        linhas = self._diario._ler("SELECT valor FROM etapas WHERE chave = ? AND etapa = ?", (self.chave, nome))
+        return json.loads(linhas[0][0]) if linhas else None
+
+    def concluir_etapa(self, nome, valor=True):
+        self._diario._gravar("INSERT OR REPLACE INTO etapas VALUES (?, ?, ?)", (self.chave, nome, json.dumps(valor)))
+
+    def itens(self):
+        """{ item: valor } de todos os itens já concluídos."""
+        linhas = self._diario._ler("SELECT item, valor FROM itens WHERE chave = ?", (self.chave,))
+        return {item: json.loads(valor) for item, valor in linhas}
+
+    def registrar_item(self, item, valor):
+        self._diario._gravar("INSERT OR REPLACE INTO itens VALUES (?, ?, ?)", (self.chave, str(item), json.dumps(valor)))
+
+    def concluir(self):
+        """Execução terminada: a próxima começa do zero mesmo em modo de retomada."""
+        self._diario._gravar("UPDATE execucoes SET concluido_em = ? WHERE chave = ?", (time.time(), self.chave))
+
+
+_diario = None
+_lock_diario = Lock()
+
+def obter_diario():
+    global _diario
+    with _lock_diario:
+        if _diario is None:
+            _diario = DiarioRetomada()
+        return _diario
@@ -0,0 +1,139 @@
+import os
+import re
+import time
+from queue import SimpleQueue, Empty
+from threading import Thread
+from datetime import datetime
+from collections import deque
+
+# --- CONFIGURAÇÃO ---
+PASTA_CACHE = os.getenv("HUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+PASTA_LOGS = os.path.join(PASTA_CACHE, "logs")
+LINHAS_TELA = int(os.getenv("LOG_LINHAS_TELA", "15"))   # o que fica em memória (e na tela) por cliente
+INTERVALO_ATUALIZACAO = float(os.getenv("LOG_INTERVALO_S", "0.5"))
+
+_FIM = object()
+
+
+class CaixaLog:
+    """
+    Log de um cliente: as últimas LINHAS_TELA linhas num buffer circular (é o que vai para a tela)
+    e o log completo num arquivo em disco (é o que vai para o download). Só a thread da CentralLog mexe aqui.
+    """
+
+    def __init__(self, nome, caminho, ao_atualizar):
+        self.nome = nome
+        self.caminho = caminho
+        self.ao_atualizar = ao_atualizar
+        self.linhas = deque(maxlen=LINHAS_TELA)
+        self.parcial = ""
+        self.alterada = False
+        self._arquivo = open(caminho, "w", encoding="utf-8")
+
+    def receber(self, texto):
+        self._arquivo.write(texto)
+        *completas, self.parcial = (self.parcial + texto).split("\n")
+        self.linhas.extend(completas)
+        self.alterada = True
+
+    def texto(self):
+        linhas = list(self.linhas) + ([self.parcial] if self.parcial else [])
+        return "\n".join(linhas[-LINHAS_TELA:])
+
+    def renderizar(self):
+        self.alterada = False
+        try:
+            self.ao_atualizar(self.texto())
+        except Exception:
+            pass  # a tela pode ter ido embora (sessão fechada); o arquivo continua completo
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class _Escritor:
+    """O que vai no lugar do sys.stdout para um cliente: write só enfileira, não renderiza nada."""
+
+    def __init__(self, fila, nome):
+        self._fila = fila
+        self._nome = nome
+
+    def write(self, texto):
+        if texto:
+            self._fila.put((self._nome, texto))
+        return len(texto)
+
+    def flush(self):
+        pass
+
+
+class CentralLog:
+    """
+    Recebe os prints de todas as threads (workers inclusos) numa fila thread-safe e, numa única
+    thread, distribui entre as caixas e redesenha na tela no máximo uma vez a cada `intervalo`
+    segundos, só as caixas que mudaram. Cada print custa um put na fila, não um redesenho.
+    Para o Streamlit, a `thread` precisa receber o contexto do script (add_script_run_ctx) antes de iniciar().
+    """
+
+    def __init__(self, nome_execucao, intervalo=INTERVALO_ATUALIZACAO, pasta=PASTA_LOGS):
+        self.pasta = os.path.join(pasta, f"{nome_execucao}_{datetime.now():%Y%m%d_%H%M%S}")
+        os.makedirs(self.pasta, exist_ok=True)
+        self.intervalo = intervalo
+        self.caixas = {}
+        self._fila = SimpleQueue()
+        self.thread = Thread(target=self._executar, name="log", daemon=True)
+
+    def caixa(self, nome, ao_atualizar):
+        """Registra o cliente e devolve o destino de escrita dele (para o RoteadorSaida ou sys.stdout)."""
+        caminho = os.path.join(self.pasta, f"{_nome_arquivo(nome)}.log")
+        self.caixas[nome] = CaixaLog(nome, caminho, ao_atualizar)
+        return _Escritor(self._fila, nome)
+
+    def iniciar(self):
+        self.thread.start()
+        return self
+
+    def encerrar(self):
+        self._fila.put(_FIM)
+        self.thread.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.encerrar()
+
+    def _executar(self):
+        proxima_tela = time.monotonic() + self.intervalo
+        encerrando = False
+        while not encerrando:
+            try:
+                item = self._fila.get(timeout=max(0.0, proxima_tela - time.monotonic()))
+            except Empty:
+                item = None
+            # Junta tudo o que chegou até a hora do próximo redesenho
+            while item is not None:
+                if item is _FIM:
+                    encerrando = True
+                    break
+                nome, texto = item
+                if nome in self.caixas:
+                    self.caixas[nome].receber(texto)
+                if time.monotonic() >= proxima_tela:
+                    break
+                try:
+                    item = self._fila.get_nowait()
+                except Empty:
+                    item = None
+            if encerrando or time.monotonic() >= proxima_tela:
+                for caixa in self.caixas.values():
+                    if caixa.alterada:
+                        caixa.renderizar()
+                proxima_tela = time.monotonic() + self.intervalo
+
+        for caixa in self.caixas.values():
+            caixa.fechar()
+
+
+def _nome_arquivo(nome):
+    return re.sub(r"[^\w.-]+", "_", str(nome))
@@ -0,0 +1,589 @@
+"""
+Versões locais dos serviços externos, para testar e medir o hub sem tocar produção.
+Drive e Sheets são substitutos em memória dos clientes Python (entram via clientes_google.usar_servicos);
+a API da Neoenergia é um servidor HTTP de verdade, para exercitar sessão, pool de conexões e streaming.
+Todos aceitam um SimuladorRede para latência, falhas e limite de taxa.
+"""
+import io
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import hashlib
+from threading import Lock, Thread
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httplib2
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range, ValueRenderOption
+from googleapiclient.errors import HttpError
+
+
+class SimuladorRede:
+    """
+    Latência, falhas e limite de taxa configuráveis, compartilhados pelos serviços falsos.
+    simular() dorme a latência e retorna None (segue) ou o status HTTP de erro a devolver (429/503).
+    """
+
+    def __init__(self, latencia=0.0, variacao=0.0, taxa_erro=0.0, limite_por_segundo=None, semente=None):
+        self.latencia = latencia
+        self.variacao = variacao
+        self.taxa_erro = taxa_erro
+        self.limite_por_segundo = limite_por_segundo
+        self.estatisticas = {}
+        self._aleatorio = random.Random(semente)
+        self._fichas = float(limite_por_segundo or 0)
+        self._ultima_recarga = time.monotonic()
+        self._lock = Lock()
+
+    def _contar(self, chave):
+        self.estatisticas[chave] = self.estatisticas.get(chave, 0) + 1
+
+    def simular(self, endpoint):
+        with self._lock:
+            self._contar(endpoint)
+            espera = max(0.0, self.latencia + self._aleatorio.uniform(-self.variacao, self.variacao))
+            falhou = self._aleatorio.random() < self.taxa_erro
+            limitado = False
+            if self.limite_por_segundo:
+                agora = time.monotonic()
+                self._fichas = min(self.limite_por_segundo, self._fichas + (agora - self._ultima_recarga) * self.limite_por_segundo)
+                self._ultima_recarga = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                else:
+                    limitado = True
+            if limitado:
+                self._contar("429")
+            elif falhou:
+                self._contar("503")
+        time.sleep(espera)
+        return 429 if limitado else 503 if falhou else None
+
+
+def _erro_google(status):
+    resposta = httplib2.Response({"status": status, "retry-after": "1"} if status == 429 else {"status": status})
+    conteudo = json.dumps({"error": {"code": status, "message": "erro simulado"}}).encode()
+    return HttpError(resposta, conteudo)
+
+
+def _erro_sheets(status):
+    resposta = requests.Response()
+    resposta.status_code = status
+    resposta._content = json.dumps({"error": {"code": status, "message": "erro simulado", "status": "UNAVAILABLE"}}).encode()
+    return APIError(resposta)
+
+
+class _Requisicao:
+    """Imita o HttpRequest do googleapiclient: execute() e, para uploads resumíveis, next_chunk()."""
+
+    def __init__(self, funcao, simulador=None, endpoint=""):
+        self._funcao = funcao
+        self._simulador = simulador
+        self._endpoint = endpoint
+
+    def execute(self, num_retries=0):
+        if self._simulador is not None:
+            status = self._simulador.simular(self._endpoint)
+            if status:
+                raise _erro_google(status)
+        return self._funcao()
+
+    def next_chunk(self, num_retries=0):
+        return None, self.execute()
+
+
+def _conteudo_media(media_body):
+    if media_body is None:
+        return b""
+    return media_body.getbytes(0, media_body.size())
+
+
+class DriveFalso:
+    """
+    Drive em memória com o subconjunto da API v3 usado pelo hub:
+    files().list/get/get_media/create/update, changes().getStartPageToken/list e new_batch_http_request.
+    """
+
+    def __init__(self, simulador=None):
+        self.arquivos = {}
+        self.mudancas = []     # (sequência, file_id)
+        self.chamadas = {}
+        self.simulador = simulador
+        self._lock = Lock()
+
+    def _requisicao(self, funcao, endpoint):
+        return _Requisicao(funcao, self.simulador, f"drive.{endpoint}")
+
+    def _contar(self, nome):
+        with self._lock:
+            self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+
+    def _registrar_mudanca(self, file_id):
+        self.mudancas.append((len(self.mudancas) + 1, file_id))
+
+    # --- utilitários para montar cenários ---
+
+    def adicionar(self, nome, conteudo, pasta_id, file_id=None):
+        file_id = file_id or uuid.uuid4().hex
+        with self._lock:
+            self.arquivos[file_id] = {
+                "id": file_id, "name": nome, "parents": [pasta_id], "trashed": False,
+                "conteudo": conteudo, "size": str(len(conteudo)),
+                "md5Checksum": hashlib.md5(conteudo).hexdigest(),
+                "sha256Checksum": hashlib.sha256(conteudo).hexdigest(),
+            }
+            self._registrar_mudanca(file_id)
+        return file_id
+
+    def remover(self, file_id):
+        with self._lock:
+            self.arquivos.pop(file_id, None)
+            self._registrar_mudanca(file_id)
+
+    # --- API ---
+
+    def files(self):
+        return _ArquivosFalsos(self)
+
+    def changes(self):
+        return _MudancasFalsas(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _LoteFalso(self, callback)
+
+
+class _LoteFalso:
+    """Imita o BatchHttpRequest: uma única "requisição HTTP" que executa várias e chama o callback de cada uma."""
+
+    def __init__(self, drive, callback):
+        self.drive = drive
+        self._callback = callback
+        self._itens = []
+
+    def add(self, requisicao, callback=None, request_id=None):
+        self._itens.append((str(request_id or len(self._itens) + 1), requisicao, callback or self._callback))
+
+    def execute(self):
+        self.drive._contar("batch")
+        if self.drive.simulador is not None:
+            status = self.drive.simulador.simular("drive.batch")
+            if status:
+                raise _erro_google(status)
+        for request_id, requisicao, callback in self._itens:
+            try:
+                # Uma única ida e volta para o lote inteiro: os itens não pagam latência de novo
+                resposta, erro = requisicao._funcao(), None
+            except Exception as e:
+                resposta, erro = None, e
+            if callback:
+                callback(request_id, resposta, erro)
+
+
+def _metadados(arquivo):
+    return {k: v for k, v in arquivo.items() if k != "conteudo"}
+
+
+class _ArquivosFalsos:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def list(self, q="", pageSize=100, fields=None, pageToken=None, **kwargs):
+        def executar():
+            self.drive._contar("files.list")
+            pasta = re.search(r"'([^']+)' in parents", q)
+            with self.drive._lock:
+                encontrados = [
+                    _metadados(a) for a in self.drive.arquivos.values()
+                    if (not pasta or pasta.group(1) in a["parents"]) and not a["trashed"]
+                ]
+            inicio = int(pageToken or 0)
+            pagina = encontrados[inicio:inicio + pageSize]
+            resultado = {"files": pagina}
+            if inicio + pageSize < len(encontrados):
+                resultado["nextPageToken"] = str(inicio + pageSize)
+            return resultado
+        return self.drive._requisicao(executar, "files.list")
+
+    def get(self, fileId, fields=None, **kwargs):
+        def executar():
+            self.drive._contar("files.get")
+            with self.drive._lock:
+                arquivo = self.drive.arquivos.get(fileId)
+            if arquivo is None:
+                raise KeyError(fileId)
+            return _metadados(arquivo)
+        return self.drive._requisicao(executar, "files.get")
+
+    def get_media(self, fileId, **kwargs):
+        def executar():
+            self.drive._contar("files.get_media")
+            with self.drive._lock:
+                return self.drive.arquivos[fileId]["conteudo"]
+        return self.drive._requisicao(executar, "files.get_media")
+
+    def create(self, body=None, media_body=None, fields=None, **kwargs):
+        def executar():
+            self.drive._contar("files.create")
+            file_id = self.drive.adicionar(body["name"], _conteudo_media(media_body), body["parents"][0])
+            return {"id": file_id}
+        return self.drive._requisicao(executar, "files.create")
+
+    def update(self, fileId, body=None, addParents=None, removeParents=None, fields=None, **kwargs):
+        def executar():
+            self.drive._contar("files.update")
+            with self.drive._lock:
+                arquivo = self.drive.arquivos[fileId]
+                arquivo.update(body or {})
+                if addParents:
+                    arquivo["parents"].append(addParents)
+                if removeParents:
+                    arquivo["parents"].remove(removeParents)
+                self.drive._registrar_mudanca(fileId)
+            return {"id": fileId}
+        return self.drive._requisicao(executar, "files.update")
+
+
+class _MudancasFalsas:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        def executar():
+            self.drive._contar("changes.getStartPageToken")
+            with self.drive._lock:
+                return {"startPageToken": str(len(self.drive.mudancas) + 1)}
+        return self.drive._requisicao(executar, "changes.getStartPageToken")
+
+    def list(self, pageToken, pageSize=100, fields=None, **kwargs):
+        def executar():
+            self.drive._contar("changes.list")
+            inicio = int(pageToken) - 1
+            with self.drive._lock:
+                pagina = self.drive.mudancas[inicio:inicio + pageSize]
+                total = len(self.drive.mudancas)
+                mudancas = []
+                for _, file_id in pagina:
+                    arquivo = self.drive.arquivos.get(file_id)
+                    if arquivo is None:
+                        mudancas.append({"fileId": file_id, "removed": True})
+                    else:
+                        mudancas.append({"fileId": file_id, "removed": False, "file": _metadados(arquivo)})
+            resultado = {"changes": mudancas}
+            if inicio + pageSize < total:
+                resultado["nextPageToken"] = str(inicio + pageSize + 1)
+            else:
+                resultado["newStartPageToken"] = str(total + 1)
+            return resultado
+        return self.drive._requisicao(executar, "changes.list")
+
+
+# --- SHEETS ---
+
+_PADRAO_FAIXA_ABSOLUTA = re.compile(r"^'((?:[^']|'')*)'!(.+)$")
+
+def _separar_faixa(faixa):
+    correspondencia = _PADRAO_FAIXA_ABSOLUTA.match(faixa)
+    if correspondencia:
+        return correspondencia.group(1).replace("''", "'"), correspondencia.group(2)
+    return None, faixa
+
+
+class ClienteSheetsFalso:
+    """Substituto do cliente gspread: open_by_key devolve planilhas em memória criadas com criar_planilha."""
+
+    def __init__(self, simulador=None):
+        self.simulador = simulador
+        self.planilhas = {}
+        self.chamadas = {}
+        self._lock = Lock()
+
+    def criar_planilha(self, planilha_id, abas=()):
+        planilha = PlanilhaFalsa(self, planilha_id)
+        for nome in abas:
+            planilha.adicionar_aba(nome)
+        self.planilhas[planilha_id] = planilha
+        return planilha
+
+    def open_by_key(self, planilha_id):
+        return self.planilhas[planilha_id]
+
+    def _chamar(self, endpoint):
+        with self._lock:
+            self.chamadas[endpoint] = self.chamadas.get(endpoint, 0) + 1
+        if self.simulador is not None:
+            status = self.simulador.simular(f"sheets.{endpoint}")
+            if status:
+                raise _erro_sheets(status)
+
+
+class PlanilhaFalsa:
+    def __init__(self, cliente, planilha_id):
+        self.cliente = cliente
+        self.id = planilha_id
+        self.abas = {}
+        self._lock = Lock()
+
+    def adicionar_aba(self, nome):
+        aba = AbaFalsa(self, nome, len(self.abas) + 1)
+        self.abas[nome] = aba
+        return aba
+
+    def worksheets(self):
+        self.cliente._chamar("fetch_sheet_metadata")
+        return list(self.abas.values())
+
+    def worksheet(self, nome):
+        self.cliente._chamar("fetch_sheet_metadata")
+        return self.abas[nome]
+
+    def _aba(self, nome):
+        return self.abas[nome] if nome is not None else next(iter(self.abas.values()))
+
+    def values_batch_get(self, ranges, params=None):
+        self.cliente._chamar("values_batch_get")
+        sem_formatacao = (params or {}).get("valueRenderOption") == ValueRenderOption.unformatted
+        with self._lock:
+            faixas = []
+            for faixa in ranges:
+                nome, a1 = _separar_faixa(faixa)
+                faixas.append({"range": faixa, "values": self._aba(nome)._ler(a1, sem_formatacao)})
+        return {"valueRanges": faixas}
+
+    def values_batch_update(self, body):
+        self.cliente._chamar("values_batch_update")
+        with self._lock:
+            for item in body.get("data", []):
+                nome, a1 = _separar_faixa(item["range"])
+                self._aba(nome)._escrever(a1, item["values"])
+        return {"totalUpdatedCells": sum(len(l) for item in body.get("data", []) for l in item["values"])}
+
+    def batch_update(self, body):
+        self.cliente._chamar("batch_update")
+        with self._lock:
+            por_id = {aba.id: aba for aba in self.abas.values()}
+            for requisicao in body.get("requests", []):
+                if "insertDimension" in requisicao:
+                    faixa = requisicao["insertDimension"]["range"]
+                    aba = por_id[faixa["sheetId"]]
+                    aba._garantir_linhas(faixa["startIndex"])
+                    aba.linhas[faixa["startIndex"]:faixa["startIndex"]] = [[] for _ in range(faixa["endIndex"] - faixa["startIndex"])]
+                elif "deleteDimension" in requisicao:
+                    faixa = requisicao["deleteDimension"]["range"]
+                    del por_id[faixa["sheetId"]].linhas[faixa["startIndex"]:faixa["endIndex"]]
+        return {}
+
+
+_EPOCA_SHEETS = date(1899, 12, 30)
+_PADRAO_NUMERO = re.compile(r"^-?\d+([.,]\d+)?$")
+
+
+def _valor_sem_formatacao(texto):
+    """
+    Como o Sheets devolve com UNFORMATTED_VALUE o que foi escrito com USER_ENTERED:
+    TRUE/FALSE viram bool, números viram int/float (zeros à esquerda somem), datas viram o serial.
+    """
+    if texto.upper() in ("TRUE", "FALSE"):
+        return texto.upper() == "TRUE"
+    if _PADRAO_NUMERO.match(texto):
+        numero = float(texto.replace(",", "."))
+        return int(numero) if numero.is_integer() else numero
+    try:
+        return (date.fromisoformat(texto) - _EPOCA_SHEETS).days
+    except ValueError:
+        return texto
+
+
+class AbaFalsa:
+    """
+    Grade de strings (como foram escritas); a linha 0 é o cabeçalho, como na planilha real.
+    Leituras com UNFORMATTED_VALUE devolvem números, booleanos e datas como a API.
+    """
+
+    def __init__(self, planilha, titulo, aba_id):
+        self.planilha = planilha
+        self.title = titulo
+        self.id = aba_id
+        self.linhas = [[]]
+
+    def _garantir_linhas(self, n):
+        while len(self.linhas) < n:
+            self.linhas.append([])
+
+    def _ler(self, a1, sem_formatacao=False):
+        grade = a1_range_to_grid_range(a1)
+        inicio_l, fim_l = grade.get("startRowIndex", 0), grade.get("endRowIndex", len(self.linhas))
+        inicio_c, fim_c = grade.get("startColumnIndex", 0), grade.get("endColumnIndex")
+        valores = []
+        for linha in self.linhas[inicio_l:fim_l]:
+            trecho = list(linha[inicio_c:fim_c])
+            while trecho and trecho[-1] in ("", None):
+                trecho.pop()
+            valores.append([_valor_sem_formatacao(v) for v in trecho] if sem_formatacao else trecho)
+        # Como a API: linhas vazias no fim não vêm
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+    def _escrever(self, a1, valores):
+        grade = a1_range_to_grid_range(a1)
+        inicio_l, inicio_c = grade.get("startRowIndex", 0), grade.get("startColumnIndex", 0)
+        for i, linha in enumerate(valores):
+            self._garantir_linhas(inicio_l + i + 1)
+            destino = self.linhas[inicio_l + i]
+            for j, valor in enumerate(linha):
+                while len(destino) <= inicio_c + j:
+                    destino.append("")
+                destino[inicio_c + j] = "" if valor is None else str(valor) if not isinstance(valor, bool) else ("TRUE" if valor else "FALSE")
+
+    def get_values(self, range_name=None, value_render_option=None, **kwargs):
+        self.planilha.cliente._chamar("values_get")
+        with self.planilha._lock:
+            return self._ler(range_name or "A1:ZZ", value_render_option == ValueRenderOption.unformatted)
+
+    def batch_get(self, ranges, **kwargs):
+        self.planilha.cliente._chamar("values_batch_get")
+        with self.planilha._lock:
+            return [self._ler(a1) for a1 in ranges]
+
+    def batch_update(self, dados, value_input_option=None, **kwargs):
+        self.planilha.cliente._chamar("values_batch_update")
+        with self.planilha._lock:
+            for item in dados:
+                self._escrever(item["range"], item["values"])
+        return {}
+
+
+# --- API DA NEOENERGIA ---
+
+def gerar_contas(n_clientes, n_ucs, n_faturas, paginas=1, semente=0):
+    """
+    Massa sintética: { login: { uc: [faturas no formato da API] } } e { numeroFatura: páginas }.
+    Vencimentos a partir de 2025 (o extrator ignora faturas antes de 2024-12).
+    """
+    aleatorio = random.Random(semente)
+    situacoes = ["Pago", "Pago", "Pago", "A Vencer", "Vencidas"]
+    contas, paginas_por_fatura = {}, {}
+    numero = 100000000
+    for c in range(n_clientes):
+        login = f"{c:011d}"
+        contas[login] = {}
+        for u in range(n_ucs):
+            uc = f"7{c:04d}{u:05d}"
+            faturas = []
+            for k in range(n_faturas):
+                numero += 1
+                vencimento = date(2025, 1, 10) + timedelta(days=30 * k)
+                faturas.append({
+                    "numeroFatura": str(numero),
+                    "mesReferencia": vencimento.strftime("%Y/%m"),
+                    "dataEmissao": (vencimento - timedelta(days=10)).isoformat(),
+                    "dataVencimento": vencimento.isoformat(),
+                    "valorEmissao": f"{aleatorio.uniform(50, 5000):.2f}",
+                    "statusFatura": aleatorio.choice(situacoes),
+                })
+                paginas_por_fatura[str(numero)] = paginas
+            contas[login][uc] = faturas
+    return contas, paginas_por_fatura
+
+
+def gerar_pdf_fatura(numero, paginas):
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for p in range(paginas):
+        c.setFont("Helvetica", 10)
+        for linha in range(40):
+            c.drawString(40, 800 - linha * 18, f"Fatura {numero} - página {p + 1} - item {linha:02d}")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+class ServidorNeoenergiaFalso:
+    """
+    Servidor HTTP local com os endpoints da API da Neoenergia usados pelo extrator:
+    /ucs, /obterProtocolo, /faturas/ucs/faturas e /faturas/{n}/pdf (PDF em base64 no campo fileData).
+    Aponte o extrator para ele com NEOENERGIA_API_URL=servidor.url.
+    """
+
+    def __init__(self, contas, paginas_por_fatura=None, simulador=None):
+        self.contas = contas
+        self.paginas_por_fatura = paginas_por_fatura or {}
+        self.simulador = simulador or SimuladorRede()
+        self._pdfs = {}
+        self._lock_pdfs = Lock()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._criar_handler())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self):
+        self._thread = Thread(target=self._servidor.serve_forever, daemon=True, name="neoenergia-falsa")
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def _pdf(self, numero):
+        with self._lock_pdfs:
+            if numero not in self._pdfs:
+                self._pdfs[numero] = base64.b64encode(gerar_pdf_fatura(numero, self.paginas_por_fatura.get(numero, 1)))
+            return self._pdfs[numero]
+
+    def _responder(self, caminho, parametros):
+        """Retorna (endpoint, status, corpo em bytes)."""
+        if m := re.fullmatch(r"/imoveis/1\.1\.0/clientes/([^/]+)/ucs", caminho):
+            ucs = self.contas.get(m.group(1))
+            if ucs is None:
+                return "ucs", 404, b"{}"
+            return "ucs", 200, json.dumps({"ucs": [{"uc": uc} for uc in ucs]}).encode()
+        if caminho == "/protocolo/1.1.0/obterProtocolo":
+            return "protocolo", 200, json.dumps({"protocoloLegado": "2025000000001"}).encode()
+        if caminho == "/multilogin/2.0.0/servicos/faturas/ucs/faturas":
+            login, uc = parametros.get("documento", [""])[0], parametros.get("codigo", [""])[0]
+            faturas = self.contas.get(login, {}).get(uc, [])
+            return "faturas", 200, json.dumps({"faturas": faturas}).encode()
+        if m := re.fullmatch(r"/multilogin/2\.0\.0/servicos/faturas/([^/]+)/pdf", caminho):
+            if m.group(1) not in self.paginas_por_fatura:
+                return "pdf", 404, b"{}"
+            return "pdf", 200, b'{"fileName": "fatura.pdf", "fileData": "' + self._pdf(m.group(1)) + b'"}'
+        return "desconhecido", 404, b"{}"
+
+    def _criar_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                endpoint, status, corpo = servidor._responder(url.path, parse_qs(url.query))
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    status, corpo = 401, b"{}"
+                erro = servidor.simulador.simular(endpoint)
+                if erro:
+                    status, corpo = erro, b"{}"
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                if status == 429:
+                    self.send_header("Retry-After", "1")
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
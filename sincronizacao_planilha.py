@@ -0,0 +1,245 @@
+import re
+from datetime import date
+from difflib import SequenceMatcher
+
+from gspread.utils import absolute_range_name, rowcol_to_a1, ValueRenderOption
+
+from clientes_google import obter_planilha, obter_aba
+from retentativas import executar_com_retentativa
+from metricas import medir
+
+# --- LAYOUT DA ABA DE CONTROLE ---
+# A:G dados da fatura | J link do PDF | K link PAGO | M:R flags marcadas pela equipe
+# H, I e L não são gerenciadas aqui: ficam com a posição na planilha, não com a fatura. Linhas inseridas
+# ou removidas levam as suas, mas quando o diff reescreve uma linha no lugar (outra fatura passa a ocupar
+# aquela posição) a fatura nova herda H, I e L da antiga. Não são copiadas como a K porque a leitura é
+# de valores (UNFORMATTED_VALUE) e regravá-las apagaria fórmulas.
+COLUNAS_PLANILHA = ["codigo_cliente", "mesReferencia", "numeroFatura", "emissão", "vencimento", "valor", "situação"]
+COLUNAS_FLAGS = ['M', 'N', 'O', 'P', 'Q', 'R']
+INTERVALO_LEITURA = "A2:R"
+LARGURA = 18                         # A..R
+IDX_CODIGO = 0                       # coluna A
+IDX_FATURA = 2                       # coluna C
+IDX_LINK = 9                         # coluna J
+IDX_PAGO = 10                        # coluna K
+IDX_FLAGS = list(range(12, 18))      # colunas M:R dentro de A:R
+IDX_GERENCIADAS = list(range(0, 7)) + [IDX_LINK, IDX_PAGO] + IDX_FLAGS
+
+_EPOCA_SHEETS = date(1899, 12, 30)
+_PADRAO_DATA = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_PADRAO_NUMERO = re.compile(r"^-?\d+(,\d+)?$")
+
+# --- LEITURA ---
+
+def extrair_flags(linhas):
+    """{ chave_linha: { 'M': bool, ..., 'R': bool } } a partir das linhas lidas de A2:R."""
+    resultado = {}
+    for linha in linhas:
+        if len(linha) > IDX_FATURA:
+            flags = {}
+            for coluna, indice in zip(COLUNAS_FLAGS, IDX_FLAGS):
+                flags[coluna] = indice < len(linha) and str(linha[indice]).upper() == 'TRUE'
+            resultado[chave_linha(linha[IDX_CODIGO], linha[IDX_FATURA])] = flags
+    return resultado
+
+def _texto_chave(valor):
+    """
+    Lido com UNFORMATTED_VALUE, o que escrevemos como "0123" volta como o número 123;
+    números e textos só de dígitos viram a mesma chave.
+    """
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip()
+    return texto.lstrip("0") or "0" if texto.isdigit() else texto
+
+def chave_linha(codigo, fatura):
+    # UCs sem fatura aparecem como "N/A" e só se distinguem pelo código do cliente
+    fatura = _texto_chave(fatura)
+    return f"N/A:{_texto_chave(codigo)}" if fatura == "N/A" else fatura
+
+def _normalizar(valor):
+    """
+    Deixa comparáveis o que lemos (UNFORMATTED_VALUE: números, booleanos, datas como serial)
+    e o que escrevemos (strings interpretadas pelo Sheets com USER_ENTERED).
+    """
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if valor is None:
+        return ""
+    texto = str(valor).strip()
+    if texto.upper() in ("TRUE", "FALSE"):
+        return texto.upper() == "TRUE"
+    if _PADRAO_DATA.match(texto):
+        try:
+            return float((date.fromisoformat(texto) - _EPOCA_SHEETS).days)
+        except ValueError:
+            return texto
+    if _PADRAO_NUMERO.match(texto):
+        return float(texto.replace(",", "."))
+    return texto
+
+# --- PLANEJAMENTO DA ATUALIZAÇÃO ---
+
+def _linhas_alvo(df, linhas_atuais, codigos_preservados=()):
+    """
+    Conteúdo final das colunas gerenciadas para cada fatura do DataFrame, na ordem do DataFrame.
+    Linhas atuais das UCs em codigos_preservados (listagem falhou) continuam como estão,
+    logo abaixo da linha que as precedia, em vez de serem removidas com o link PAGO e as flags.
+    """
+    por_chave = {chave_linha(l[IDX_CODIGO], l[IDX_FATURA]): l for l in linhas_atuais if len(l) > IDX_FATURA}
+    flags_salvas = extrair_flags(linhas_atuais)
+
+    dados = df[COLUNAS_PLANILHA].astype(str).values.tolist()
+    links = df["link_drive"].tolist() if "link_drive" in df.columns else [None] * len(df)
+    chaves, alvo = [], []
+    for valores, link in zip(dados, links):
+        chave = chave_linha(valores[IDX_CODIGO], valores[IDX_FATURA])
+        linha = [None] * LARGURA
+        linha[0:7] = valores
+        linha[IDX_LINK] = link if isinstance(link, str) else ""
+        # O link PAGO (K) pertence à fatura: acompanha ela mesmo se a linha mudar de posição
+        anterior = por_chave.get(chave, [])
+        linha[IDX_PAGO] = anterior[IDX_PAGO] if len(anterior) > IDX_PAGO else ""
+        salvas = flags_salvas.get(chave, {})
+        for coluna, indice in zip(COLUNAS_FLAGS, IDX_FLAGS):
+            linha[indice] = salvas.get(coluna, False)
+        chaves.append(chave)
+        alvo.append(linha)
+
+    preservados = {_texto_chave(c) for c in codigos_preservados}
+    if not preservados:
+        return chaves, alvo
+    posicao = {chave: i for i, chave in enumerate(chaves)}
+    depois_de = {}                                   # índice em alvo (-1 = topo) -> linhas mantidas
+    ancora = -1
+    for atual in linhas_atuais:
+        if len(atual) <= IDX_FATURA or not str(atual[IDX_FATURA]).strip():
+            continue
+        chave = chave_linha(atual[IDX_CODIGO], atual[IDX_FATURA])
+        if chave in posicao:
+            ancora = posicao[chave]
+        elif _texto_chave(atual[IDX_CODIGO]) in preservados:
+            mantida = list(atual[:LARGURA]) + [""] * (LARGURA - len(atual))
+            depois_de.setdefault(ancora, []).append((chave, mantida))
+    chaves_finais, alvo_final = [], []
+    for i in range(-1, len(alvo)):
+        if i >= 0:
+            chaves_finais.append(chaves[i])
+            alvo_final.append(alvo[i])
+        for chave, mantida in depois_de.get(i, []):
+            chaves_finais.append(chave)
+            alvo_final.append(mantida)
+    return chaves_finais, alvo_final
+
+def _intervalos_alterados(grade, alvo):
+    """Agrupa as células diferentes em retângulos (trechos contíguos na linha, repetidos em linhas seguidas)."""
+    trechos = {}
+    for i, (atual, desejada) in enumerate(zip(grade, alvo)):
+        j = 0
+        while j < LARGURA:
+            if j in IDX_GERENCIADAS and _normalizar(atual[j]) != _normalizar(desejada[j]):
+                inicio = j
+                while j + 1 < LARGURA and (j + 1) in IDX_GERENCIADAS and _normalizar(atual[j + 1]) != _normalizar(desejada[j + 1]):
+                    j += 1
+                trechos.setdefault((inicio, j), []).append(i)
+            j += 1
+
+    intervalos = []
+    for (c0, c1), linhas in trechos.items():
+        bloco = [linhas[0]]
+        for i in linhas[1:] + [None]:
+            if i is not None and i == bloco[-1] + 1:
+                bloco.append(i)
+                continue
+            faixa = f"{rowcol_to_a1(bloco[0] + 2, c0 + 1)}:{rowcol_to_a1(bloco[-1] + 2, c1 + 1)}"
+            intervalos.append((faixa, [alvo[r][c0:c1 + 1] for r in bloco]))
+            if i is not None:
+                bloco = [i]
+    return intervalos
+
+def planejar_atualizacao(df, linhas_atuais, sheet_id, codigos_preservados=()):
+    """
+    Compara a aba atual com o DataFrame ordenado, chaveando por numeroFatura.
+    codigos_preservados: UCs cuja listagem falhou; as linhas delas na aba não são removidas.
+    Retorna (requisições de inserir/remover linhas, intervalos de valores alterados, resumo).
+    O custo da escrita cresce com o número de mudanças, não com o histórico do cliente.
+    """
+    atuais = [list(l) + [""] * (LARGURA - len(l)) for l in linhas_atuais]
+    chaves_atuais = [
+        chave_linha(l[IDX_CODIGO], l[IDX_FATURA]) if str(l[IDX_FATURA]).strip() else f"__vazia_{i}"
+        for i, l in enumerate(atuais)
+    ]
+    chaves_novas, alvo = _linhas_alvo(df, linhas_atuais, codigos_preservados)
+
+    # Aplica as inserções/remoções de baixo para cima (os índices de cima continuam válidos)
+    # e simula o resultado em memória para saber o que ainda precisa ser escrito.
+    grade = [list(l) for l in atuais]
+    requisicoes, inseridas, removidas = [], 0, 0
+    opcodes = SequenceMatcher(None, chaves_atuais, chaves_novas, autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        if tag == "equal":
+            continue
+        n_atual, n_novo = i2 - i1, j2 - j1
+        no_final = i2 == len(atuais)
+        if n_atual > n_novo and not no_final:
+            inicio = i1 + n_novo
+            requisicoes.append({"deleteDimension": {"range": {
+                "sheetId": sheet_id, "dimension": "ROWS", "startIndex": inicio + 1, "endIndex": i2 + 1}}})
+            del grade[inicio:i2]
+            removidas += i2 - inicio
+        elif n_novo > n_atual and not no_final:
+            inicio = i1 + n_atual
+            quantidade = n_novo - n_atual
+            requisicoes.append({"insertDimension": {
+                "range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": inicio + 1, "endIndex": inicio + 1 + quantidade},
+                "inheritFromBefore": inicio > 0}})
+            grade[inicio:inicio] = [[""] * LARGURA for _ in range(quantidade)]
+            inseridas += quantidade
+
+    # Linhas que sobraram no fim são limpas; linhas novas no fim só precisam dos valores
+    while len(grade) < len(alvo):
+        grade.append([""] * LARGURA)
+        inseridas += 1
+    sobra = len(grade) - len(alvo)
+    alvo = alvo + [["" if j not in IDX_FLAGS else False for j in range(LARGURA)] for _ in range(sobra)]
+    removidas += sobra
+
+    intervalos = _intervalos_alterados(grade, alvo)
+    resumo = {
+        "linhas_inseridas": inseridas,
+        "linhas_removidas": removidas,
+        "celulas_alteradas": sum(len(v) * len(v[0]) for _, v in intervalos),
+    }
+    return requisicoes, intervalos, resumo
+
+# --- SINCRONIZAÇÃO ---
+
+def sincronizar_planilha(planilha_id, nome_aba, df, codigos_preservados=()):
+    """
+    Lê A2:R uma vez e escreve só o que mudou (mais um batch_update se houver linhas inseridas/removidas).
+    codigos_preservados: UCs fora do DataFrame por falha na listagem, cujas linhas ficam na aba.
+    """
+    with medir("sheets_leitura"):
+        planilha = executar_com_retentativa(obter_planilha, planilha_id, endpoint="sheets")
+        aba = executar_com_retentativa(obter_aba, planilha_id, nome_aba, endpoint="sheets")
+        linhas_atuais = executar_com_retentativa(
+            aba.get_values, INTERVALO_LEITURA, value_render_option=ValueRenderOption.unformatted, endpoint="sheets"
+        )
+    requisicoes, intervalos, resumo = planejar_atualizacao(df, linhas_atuais, aba.id, codigos_preservados)
+
+    with medir("sheets_escrita"):
+        if requisicoes:
+            executar_com_retentativa(planilha.batch_update, {"requests": requisicoes}, endpoint="sheets")
+        if intervalos:
+            executar_com_retentativa(planilha.values_batch_update, {
+                "valueInputOption": "USER_ENTERED",
+                "data": [
+                    {"range": absolute_range_name(nome_aba, faixa), "values": valores}
+                    for faixa, valores in intervalos
+                ],
+            }, endpoint="sheets")
+    print(f"  ✏️ Sheets: {resumo['celulas_alteradas']} células alteradas, "
+          f"{resumo['linhas_inseridas']} linhas inseridas, {resumo['linhas_removidas']} removidas.")
+    return resumo
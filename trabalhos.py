@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import subprocess
+from threading import Lock, RLock
+
+from saida_log import CentralLog
+
+# --- CONFIGURAÇÃO ---
+PASTA_CACHE = os.getenv("HUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+ARQUIVO_TRABALHOS = os.path.join(PASTA_CACHE, "trabalhos.sqlite3")
+
+EXTRACAO = "extracao"
+PAGO = "pago"
+
+PENDENTE, EXECUTANDO, CONCLUIDO, FALHOU, INTERROMPIDO = "pendente", "executando", "concluido", "falhou", "interrompido"
+ATIVOS = (PENDENTE, EXECUTANDO)
+# Trabalho criado que não chegou a registrar o processo nesse tempo: o processo nem subiu
+TOLERANCIA_INICIO_S = 120
+
+
+class TrabalhoDuplicado(Exception):
+    def __init__(self, abas, trabalho_id):
+        super().__init__(f"já existe uma execução em andamento (#{trabalho_id}) para: {', '.join(abas)}")
+        self.abas = abas
+        self.trabalho_id = trabalho_id
+
+
+class RegistroTrabalhos:
+    """
+    Estado e progresso das execuções em segundo plano (SQLite), compartilhado entre o processo do
+    Streamlit, que cria e consulta, e o processo de cada execução, que atualiza.
+    Uma aba só pode estar em uma execução ativa por vez, seja de extração ou de PAGO: as duas escrevem nela.
+    """
+
+    def __init__(self, caminho=ARQUIVO_TRABALHOS):
+        if caminho != ":memory:":
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = RLock()
+        # isolation_level=None: as transações são abertas à mão (BEGIN IMMEDIATE na criação)
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conexao.row_factory = sqlite3.Row
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.executescript("""
+            CREATE TABLE IF NOT EXISTS trabalhos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, tipo TEXT NOT NULL, estado TEXT NOT NULL,
+                pid INTEGER, criado_em REAL NOT NULL, iniciado_em REAL, terminado_em REAL,
+                log_recente TEXT, pasta_log TEXT, metricas TEXT, erro TEXT
+            );
+            CREATE TABLE IF NOT EXISTS trabalho_clientes (
+                trabalho_id INTEGER NOT NULL, cliente TEXT NOT NULL, aba TEXT NOT NULL, estado TEXT NOT NULL,
+                log_recente TEXT, resultado TEXT, atualizado_em REAL,
+                PRIMARY KEY (trabalho_id, cliente)
+            );
+            CREATE INDEX IF NOT EXISTS idx_trabalhos_estado ON trabalhos (estado);
+        """)
+
+    def _executar(self, sql, parametros=()):
+        with self._lock:
+            return self._conexao.execute(sql, parametros)
+
+    # --- CRIAÇÃO (processo do Streamlit) ---
+
+    def criar(self, tipo, clientes_abas):
+        """Registra a execução de { cliente: aba } ou levanta TrabalhoDuplicado se alguma aba já está em uso."""
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                self._marcar_interrompidos()
+                marcadores = ",".join("?" * len(clientes_abas))
+                em_uso = self._conexao.execute(
+                    f"SELECT tc.aba, t.id FROM trabalho_clientes tc JOIN trabalhos t ON t.id = tc.trabalho_id "
+                    f"WHERE t.estado IN (?, ?) AND tc.aba IN ({marcadores})",
+                    (*ATIVOS, *clientes_abas.values()),
+                ).fetchall()
+                if em_uso:
+                    raise TrabalhoDuplicado(sorted({linha["aba"] for linha in em_uso}), em_uso[0]["id"])
+                trabalho_id = self._conexao.execute(
+                    "INSERT INTO trabalhos (tipo, estado, criado_em) VALUES (?, ?, ?)", (tipo, PENDENTE, agora)
+                ).lastrowid
+                self._conexao.executemany(
+                    "INSERT INTO trabalho_clientes (trabalho_id, cliente, aba, estado, atualizado_em) VALUES (?, ?, ?, ?, ?)",
+                    [(trabalho_id, cliente, aba, PENDENTE, agora) for cliente, aba in clientes_abas.items()],
+                )
+                self._conexao.execute("COMMIT")
+                return trabalho_id
+            except BaseException:
+                self._conexao.execute("ROLLBACK")
+                raise
+
+    def _marcar_interrompidos(self):
+        """Execuções "ativas" cujo processo morreu (reinício do container, kill) deixam de bloquear as abas."""
+        agora = time.time()
+        for linha in self._conexao.execute(
+            "SELECT id, pid, criado_em FROM trabalhos WHERE estado IN (?, ?)", ATIVOS
+        ).fetchall():
+            morto = not _processo_vivo(linha["pid"]) if linha["pid"] else agora - linha["criado_em"] > TOLERANCIA_INICIO_S
+            if morto:
+                self._conexao.execute(
+                    "UPDATE trabalhos SET estado = ?, terminado_em = ?, erro = ? WHERE id = ?",
+                    (INTERROMPIDO, agora, "processo da execução não está mais rodando", linha["id"]),
+                )
+                self._conexao.execute(
+                    "UPDATE trabalho_clientes SET estado = ?, atualizado_em = ? WHERE trabalho_id = ? AND estado IN (?, ?)",
+                    (INTERROMPIDO, agora, linha["id"], *ATIVOS),
+                )
+
+    # --- ATUALIZAÇÃO (processo da execução) ---
+
+    def iniciar(self, trabalho_id, pid, pasta_log):
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE trabalhos SET estado = ?, pid = ?, iniciado_em = ?, pasta_log = ? WHERE id = ?",
+                (EXECUTANDO, pid, agora, pasta_log, trabalho_id),
+            )
+            self._conexao.execute(
+                "UPDATE trabalho_clientes SET estado = ?, atualizado_em = ? WHERE trabalho_id = ?",
+                (EXECUTANDO, agora, trabalho_id),
+            )
+
+    def progresso(self, trabalho_id, log_recente):
+        self._executar("UPDATE trabalhos SET log_recente = ? WHERE id = ?", (log_recente, trabalho_id))
+
+    def progresso_cliente(self, trabalho_id, cliente, log_recente):
+        self._executar(
+            "UPDATE trabalho_clientes SET log_recente = ?, atualizado_em = ? WHERE trabalho_id = ? AND cliente = ?",
+            (log_recente, time.time(), trabalho_id, cliente),
+        )
+
+    def concluir_cliente(self, trabalho_id, cliente, estado, resultado):
+        self._executar(
+            "UPDATE trabalho_clientes SET estado = ?, resultado = ?, atualizado_em = ? WHERE trabalho_id = ? AND cliente = ?",
+            (estado, resultado, time.time(), trabalho_id, cliente),
+        )
+
+    def finalizar(self, trabalho_id, estado, erro=None, metricas=None):
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute(
+                "UPDATE trabalhos SET estado = ?, terminado_em = ?, erro = ?, metricas = ? WHERE id = ?",
+                (estado, agora, erro, metricas, trabalho_id),
+            )
+            # Cliente que não chegou a ter resultado (execução caiu no meio) termina junto com ela
+            self._conexao.execute(
+                "UPDATE trabalho_clientes SET estado = ?, atualizado_em = ? WHERE trabalho_id = ? AND estado IN (?, ?)",
+                (estado if estado != CONCLUIDO else FALHOU, agora, trabalho_id, *ATIVOS),
+            )
+
+    # --- CONSULTA (processo do Streamlit) ---
+
+    def listar(self, tipo=None, limite=5):
+        """Execuções mais recentes (ativas primeiro), cada uma com a lista dos seus clientes."""
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                self._marcar_interrompidos()
+                self._conexao.execute("COMMIT")
+            except BaseException:
+                self._conexao.execute("ROLLBACK")
+                raise
+            filtro, parametros = ("WHERE tipo = ?", (tipo,)) if tipo else ("", ())
+            trabalhos = [dict(t) for t in self._conexao.execute(
+                f"SELECT * FROM trabalhos {filtro} ORDER BY estado NOT IN (?, ?), id DESC LIMIT ?",
+                (*parametros, *ATIVOS, limite),
+            )]
+            for trabalho in trabalhos:
+                trabalho["clientes"] = [dict(c) for c in self._conexao.execute(
+                    "SELECT * FROM trabalho_clientes WHERE trabalho_id = ? ORDER BY rowid", (trabalho["id"],)
+                )]
+        return trabalhos
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_registro = None
+_lock_registro = Lock()
+
+def obter_registro():
+    global _registro
+    with _lock_registro:
+        if _registro is None:
+            _registro = RegistroTrabalhos()
+        return _registro
+
+
+# --- EXECUÇÃO EM SEGUNDO PLANO ---
+# Um processo por execução: rerun do Streamlit, clique em outro widget ou navegador reconectando
+# não interrompem nada, e a thread do script fica livre para só consultar o progresso.
+# É um subprocess com este arquivo como programa, não multiprocessing: sob o Streamlit o __main__ é
+# o app.py, e o "spawn" rodaria a página inteira de novo dentro do processo filho.
+_processos = {}
+
+def submeter(tipo, clientes_abas, argumentos, max_paralelo=None, retomar=False):
+    """
+    Cria a execução e dispara o processo. argumentos: { cliente: (login, senha, aba) } na extração,
+    { cliente: aba } no PAGO. Vão pelo stdin do processo: senhas nunca ficam no disco nem na linha de comando.
+    retomar: continua do diário (retomada.py) o que uma execução anterior deixou pela metade.
+    """
+    registro = obter_registro()
+    trabalho_id = registro.criar(tipo, clientes_abas)
+    try:
+        processo = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(trabalho_id)],
+            stdin=subprocess.PIPE, start_new_session=True,
+        )
+        with processo.stdin:
+            processo.stdin.write(json.dumps({
+                "tipo": tipo, "argumentos": argumentos, "max_paralelo": max_paralelo, "retomar": retomar,
+            }).encode())
+    except Exception as e:
+        registro.finalizar(trabalho_id, FALHOU, erro=f"não foi possível iniciar o processo: {e}")
+        raise
+    _recolher_processos()
+    _processos[trabalho_id] = processo
+    return trabalho_id
+
+def listar(tipo=None, limite=5):
+    _recolher_processos()
+    return obter_registro().listar(tipo, limite)
+
+def _recolher_processos():
+    # Processo encerrado e não recolhido vira zumbi e continuaria "vivo" para o os.kill(pid, 0)
+    for trabalho_id in [i for i, p in _processos.items() if p.poll() is not None]:
+        _processos.pop(trabalho_id)
+
+
+def _executar(trabalho_id, tipo, argumentos, max_paralelo, retomar):
+    """Corpo do processo da execução: log e progresso vão para o registro, métricas para .cache/metricas."""
+    from metricas import METRICAS
+
+    registro = RegistroTrabalhos()
+    central = CentralLog(f"trabalho_{trabalho_id}_{tipo}")
+    registro.iniciar(trabalho_id, os.getpid(), central.pasta)
+    geral = central.caixa("geral", lambda texto: registro.progresso(trabalho_id, texto))
+    stdout_original = sys.stdout
+    try:
+        with central:
+            try:
+                if tipo == EXTRACAO:
+                    _executar_extracao(registro, trabalho_id, argumentos, max_paralelo, retomar, central, geral)
+                else:
+                    sys.stdout = geral
+                    _executar_pago(registro, trabalho_id, argumentos, retomar)
+            finally:
+                sys.stdout = stdout_original
+        caminho_metricas, _ = METRICAS.exportar(f"trabalho_{trabalho_id}_{tipo}")
+        registro.finalizar(trabalho_id, CONCLUIDO, metricas=caminho_metricas)
+    except BaseException as e:
+        registro.finalizar(trabalho_id, FALHOU, erro=repr(e))
+        raise
+
+
+def _executar_extracao(registro, trabalho_id, argumentos, max_paralelo, retomar, central, geral):
+    from extrator import processar_cliente
+    from agendador import executar_clientes, RoteadorSaida, MAX_CLIENTES_PARALELO
+
+    destinos = {
+        cliente: central.caixa(cliente, lambda texto, cliente=cliente: registro.progresso_cliente(trabalho_id, cliente, texto))
+        for cliente in argumentos
+    }
+    sys.stdout = RoteadorSaida(destinos, padrao=geral)
+    tarefas = {
+        cliente: (processar_cliente, (cliente, login_user, login_password, aba, retomar))
+        for cliente, (login_user, login_password, aba) in argumentos.items()
+    }
+    for cliente, sucesso, erro in executar_clientes(tarefas, max_paralelo or MAX_CLIENTES_PARALELO):
+        if erro is not None:
+            registro.concluir_cliente(trabalho_id, cliente, FALHOU, f"❌ Falha ({erro})")
+        elif sucesso:
+            registro.concluir_cliente(trabalho_id, cliente, CONCLUIDO, "✅ Sucesso")
+        else:
+            registro.concluir_cliente(trabalho_id, cliente, FALHOU, "❌ Falha no Login")
+
+
+def _executar_pago(registro, trabalho_id, argumentos, retomar):
+    from gerador_pagos import processar_faturas_pagas
+
+    resultados = processar_faturas_pagas(argumentos, retomar)
+    for cliente in argumentos:
+        status = resultados.get(cliente.upper(), "❌ Sem resultado")
+        registro.concluir_cliente(trabalho_id, cliente, CONCLUIDO if "✅" in status else FALHOU, status)
+
+
+if __name__ == "__main__":
+    pedido = json.load(sys.stdin)
+    _executar(int(sys.argv[1]), pedido["tipo"], pedido["argumentos"], pedido["max_paralelo"], pedido["retomar"])
@@ -0,0 +1,236 @@
+import os
+import io
+import base64
+import hashlib
+import tempfile
+from threading import Lock
+
+from googleapiclient.http import MediaIoBaseUpload
+
+from clientes_google import obter_drive
+
+# --- CONFIGURAÇÃO ---
+# Teto de bytes de PDF mantidos em memória somando todos os workers; o excedente vai para arquivo temporário.
+LIMITE_BYTES_MEMORIA = int(os.getenv("LIMITE_BYTES_MEMORIA", str(64 * 1024 * 1024)))
+TAMANHO_BLOCO_DOWNLOAD = 64 * 1024
+# O Drive exige blocos múltiplos de 256 KB no upload resumível
+TAMANHO_BLOCO_UPLOAD = 8 * 256 * 1024
+
+
+class OrcamentoMemoria:
+    def __init__(self, limite):
+        self.limite = limite
+        self.em_uso = 0
+        self.pico = 0
+        self._lock = Lock()
+
+    def reservar(self, n):
+        with self._lock:
+            if self.em_uso + n > self.limite:
+                return False
+            self.em_uso += n
+            self.pico = max(self.pico, self.em_uso)
+            return True
+
+    def liberar(self, n):
+        with self._lock:
+            self.em_uso -= n
+
+
+ORCAMENTO = OrcamentoMemoria(LIMITE_BYTES_MEMORIA)
+
+
+class BufferPDF(io.RawIOBase):
+    """
+    Buffer de escrita/leitura que fica em memória enquanto o orçamento global permitir
+    e passa para um arquivo temporário em disco quando não permite mais.
+    Calcula md5 e sha256 do conteúdo durante a escrita, para deduplicar antes do upload.
+    """
+
+    def __init__(self, orcamento=ORCAMENTO):
+        super().__init__()
+        self._orcamento = orcamento
+        self._arquivo = io.BytesIO()
+        self._reservado = 0
+        self.em_disco = False
+        self.tamanho = 0
+        self._md5 = hashlib.md5()
+        self._sha256 = hashlib.sha256()
+
+    @property
+    def md5(self):
+        return self._md5.hexdigest()
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, dados):
+        if not dados:
+            return 0
+        if not self.em_disco:
+            if self._orcamento.reservar(len(dados)):
+                self._reservado += len(dados)
+            else:
+                self._passar_para_disco()
+        self.tamanho += len(dados)
+        self._md5.update(dados)
+        self._sha256.update(dados)
+        return self._arquivo.write(dados)
+
+    def _passar_para_disco(self):
+        temporario = tempfile.TemporaryFile()
+        temporario.write(self._arquivo.getbuffer())
+        self._arquivo.close()
+        self._arquivo = temporario
+        self._orcamento.liberar(self._reservado)
+        self._reservado = 0
+        self.em_disco = True
+
+    def readinto(self, destino):
+        dados = self._arquivo.read(len(destino))
+        destino[:len(dados)] = dados
+        return len(dados)
+
+    def read(self, n=-1):
+        return self._arquivo.read(n)
+
+    def seek(self, posicao, origem=io.SEEK_SET):
+        return self._arquivo.seek(posicao, origem)
+
+    def tell(self):
+        return self._arquivo.tell()
+
+    def inicio(self, n):
+        """Os primeiros n bytes, sem mexer na posição atual."""
+        posicao = self._arquivo.tell()
+        self._arquivo.seek(0)
+        dados = self._arquivo.read(n)
+        self._arquivo.seek(posicao)
+        return dados
+
+    def close(self):
+        if not self.closed:
+            self._arquivo.close()
+            self._orcamento.liberar(self._reservado)
+            self._reservado = 0
+        super().close()
+
+
+class DecodificadorFileData:
+    """
+    Extrai e decodifica o campo "fileData" (base64) de uma resposta JSON recebida em blocos,
+    sem montar a resposta inteira nem a string base64 inteira em memória.
+    Um fileData que não é string (null, número) termina sem concluido, como se não existisse.
+    """
+
+    MARCADOR = b'"fileData"'
+    ESPACOS = b" \t\r\n"
+    # Escapes de JSON que podem aparecer no base64: "\/" é "/", quebras de linha (base64 MIME) são ignoradas
+    ESCAPES = {b"/": b"/", b"n": b"", b"r": b"", b"t": b""}
+
+    def __init__(self):
+        self.encontrado = False
+        self.concluido = False
+        self._estado = "procurando"   # procurando -> separador -> valor -> lendo -> fim
+        self._pendente = b""           # bytes crus ainda não interpretados
+        self._resto = b""              # base64 já limpo que não fecha um grupo de 4
+
+    def alimentar(self, bloco):
+        if self._estado == "fim" or not bloco:
+            return b""
+        dados = self._pendente + bloco
+        self._pendente = b""
+
+        if self._estado == "procurando":
+            pos = dados.find(self.MARCADOR)
+            if pos < 0:
+                # guarda o final do bloco: o marcador pode estar dividido entre dois blocos
+                self._pendente = dados[-(len(self.MARCADOR) - 1):]
+                return b""
+            self.encontrado = True
+            self._estado = "separador"
+            dados = dados[pos + len(self.MARCADOR):]
+
+        if self._estado in ("separador", "valor"):
+            dados = dados.lstrip(self.ESPACOS)
+            if not dados:
+                return b""
+            esperado = b":" if self._estado == "separador" else b'"'
+            if dados[:1] != esperado:
+                self._estado = "fim"
+                return b""
+            dados = dados[1:]
+            if self._estado == "separador":
+                self._estado = "valor"
+                return self.alimentar(dados) if dados else b""
+            self._estado = "lendo"
+
+        limpo = bytearray(self._resto)
+        inicio = 0
+        while True:
+            proximo = min((p for p in (dados.find(b"\\", inicio), dados.find(b'"', inicio)) if p >= 0), default=-1)
+            if proximo < 0:
+                limpo += dados[inicio:]
+                break
+            limpo += dados[inicio:proximo]
+            if dados[proximo:proximo + 1] == b'"':
+                self._estado = "fim"
+                break
+            if proximo + 1 == len(dados):
+                self._pendente = b"\\"   # escape dividido entre dois blocos
+                break
+            escape = dados[proximo + 1:proximo + 2]
+            if escape not in self.ESCAPES:
+                raise ValueError(f"Escape inesperado no fileData: \\{escape.decode(errors='replace')}")
+            limpo += self.ESCAPES[escape]
+            inicio = proximo + 2
+
+        if self._estado == "fim":
+            self.concluido = True
+            self._resto = b""
+            return base64.b64decode(bytes(limpo))
+        corte = len(limpo) - len(limpo) % 4
+        self._resto = bytes(limpo[corte:])
+        return base64.b64decode(bytes(limpo[:corte]))
+
+    def finalizar(self):
+        if self._estado == "lendo":
+            raise ValueError("Resposta terminou no meio do campo fileData")
+        return b""
+
+
+def baixar_file_data(resposta, buffer):
+    """Copia o PDF de uma resposta streaming da Neoenergia para o buffer. Retorna False se não houver fileData."""
+    decodificador = DecodificadorFileData()
+    for bloco in resposta.iter_content(TAMANHO_BLOCO_DOWNLOAD):
+        buffer.write(decodificador.alimentar(bloco))
+        if decodificador.concluido:
+            break
+    buffer.write(decodificador.finalizar())
+    return decodificador.concluido
+
+
+def upload_stream_para_drive(buffer, nome_arquivo, pasta_id):
+    """Sobe o conteúdo do buffer para o Drive; arquivos maiores que um bloco usam upload resumível em partes."""
+    buffer.seek(0)
+    resumivel = buffer.tamanho > TAMANHO_BLOCO_UPLOAD
+    media = MediaIoBaseUpload(buffer, mimetype="application/pdf", chunksize=TAMANHO_BLOCO_UPLOAD, resumable=resumivel)
+    requisicao = obter_drive().files().create(
+        body={"name": nome_arquivo, "parents": [pasta_id]}, media_body=media, fields="id"
+    )
+    if not resumivel:
+        return requisicao.execute().get("id")
+    resposta = None
+    while resposta is None:
+        _, resposta = requisicao.next_chunk()
+    return resposta.get("id")